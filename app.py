@@ -29,6 +29,15 @@ class StgkStarterApp(Application):
         # and business logic of the app is kept. By using the import_module command,
         # toolkit's code reload mechanism will work properly.
         app_payload = self.import_module("app")
+        self._app_payload = app_payload
+
+        # session wide cache of the path cache and context lookups, shared by all dialogs
+        self.context_cache = app_payload.context_cache.ContextCache(self.sgtk,
+                                                                    ttl=self.get_setting("context_cache_ttl"),
+                                                                    max_size=self.get_setting("context_cache_size"))
+
+        # session wide limits of the concurrent transfers and bandwidth per destination volume
+        self.io_scheduler = app_payload.io_scheduler.IOScheduler.from_app(self)
 
         # now register a *command*, which is normally a menu entry of some kind on a Shotgun
         # menu (but it depends on the engine). The engine will manage this command and
@@ -36,7 +45,7 @@ class StgkStarterApp(Application):
 
         # first, set up our callback, calling out to a method inside the app module contained
         # in the python folder of the app
-        menu_callback = lambda: app_payload.dialog.show_dialog(self)
+        menu_callback = lambda: app_payload.show_dialog(self)
 
         display_name = self.get_setting("display_name")
         # "Naming Convention" ---> naming_convention
@@ -52,3 +61,65 @@ class StgkStarterApp(Application):
 
         # now register the command with the engine
         self.engine.register_command(display_name, menu_callback, menu_options)
+
+        # batch resolution of a manifest of tasks/templates, ie: tank resolve_paths manifest.csv output.csv
+        batch_callback = lambda *args: app_payload.batch.run_command(self, *args)
+
+        batch_options = {
+            "short_name": "resolve_paths",
+            "description": "Resolve template paths for every row of a CSV/JSON manifest",
+            }
+
+        self.engine.register_command("Resolve Paths From Manifest", batch_callback, batch_options)
+
+        # copy throughput of the copy engine settings on a storage, ie: tank benchmark_copy big.mov /mnt/filer01/tmp
+        benchmark_callback = lambda *args: app_payload.benchmark.run_command(self, *args)
+
+        benchmark_options = {
+            "short_name": "benchmark_copy",
+            "description": "Benchmark the copy engine settings copying a large file to a directory",
+            }
+
+        self.engine.register_command("Benchmark Copy", benchmark_callback, benchmark_options)
+
+        # work areas of every task assigned to the current user or of a sequence, ie: tank create_work_areas 1234
+        work_areas_callback = lambda *args: app_payload.work_areas.run_command(self, *args)
+
+        work_areas_options = {
+            "short_name": "create_work_areas",
+            "description": "Create the work areas of my tasks, or of every task of a sequence",
+            }
+
+        self.engine.register_command("Create Work Areas", work_areas_callback, work_areas_options)
+
+        # files under a directory that match no template, ie: tank audit_naming /mnt/projects/signs unmatched.csv
+        audit_callback = lambda *args: app_payload.audit.run_command(self, *args)
+
+        audit_options = {
+            "short_name": "audit_naming",
+            "description": "Report the files under a directory that don't match any template",
+            }
+
+        self.engine.register_command("Audit Naming", audit_callback, audit_options)
+
+        # warm Toolkit for DCCs without integration, see python/naming_client.py, ie: tank naming_service
+        service_callback = lambda *args: app_payload.service.run_command(self, *args)
+
+        service_options = {
+            "short_name": "naming_service",
+            "description": "Serve template resolutions to DCCs without Toolkit over a local socket",
+            }
+
+        self.engine.register_command("Naming Service", service_callback, service_options)
+
+    def get_path_resolver(self):
+        """
+        Get a headless path resolver sharing this app's settings. Farm and batch tools
+        can use it to resolve template paths without importing Qt or building the dialog.
+
+        resolver = app.get_path_resolver()
+        path = resolver.resolve(context, 'shot_maya_work', {'name': 'main', 'version': 3}).file_path
+
+        :return: PathResolver
+        """
+        return self._app_payload.resolver.PathResolver(self.sgtk, self.get_setting("custom_entity_name_remap"))
@@ -8,4 +8,21 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from . import dialog
+from . import audit
+from . import batch
+from . import benchmark
+from . import context_cache
+from . import io_scheduler
+from . import resolver
+from . import service
+from . import template_index
+from . import work_areas
+
+
+def show_dialog(app_instance):
+    """
+    Shows the main dialog window. The Qt dialog is imported on demand so the
+    headless modules above can be used by tools running without a UI.
+    """
+    from . import dialog
+    dialog.show_dialog(app_instance)
@@ -0,0 +1,565 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Naming convention audit of a shot or project tree: every file is checked against the
+templates of the pipeline configuration, and the files matching none are reported.
+
+    tank audit_naming /mnt/projects/signs/sequences unmatched.csv [--matched] [--full]
+
+Reports are streamed as JSON lines, or as CSV when writing to a .csv file.
+
+The results of every directory are kept in a local SQLite database with the directory mtime,
+later runs only list the directories that changed since and reuse the stored results of the
+others.
+
+Directories are listed on threads, matching their files against the templates is CPU bound
+and runs in a pool of forked processes, each using the template index the audit built before
+forking them. Nothing in here may import Qt.
+"""
+
+import csv
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import sgtk
+
+from .template_index import get_template_index, split_path
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_WORKERS = 16
+DEFAULT_PROCESSES = 0
+DEFAULT_IGNORE = ['.*', 'Thumbs.db']
+
+STATUS_MATCHED = 'matched'
+STATUS_UNMATCHED = 'unmatched'
+STATUS_ERROR = 'error'
+
+REPORT_COLUMNS = ('status', 'path', 'template', 'error')
+
+# Seconds between progress messages
+PROGRESS_INTERVAL = 10
+
+# Directories changed this close to the start of a run may change again within the same mtime
+# tick unnoticed, their results are stored but checked again on the next run
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+# Directories written to the state database per transaction
+STATE_BATCH_SIZE = 500
+
+STATE_FILE_NAME = 'naming_audit.sqlite'
+
+# Template index of the classification processes, inherited from the audit when they are forked
+_process_index = None
+
+DirectoryRecord = namedtuple('DirectoryRecord', ['mtime_ns', 'entries', 'digest', 'subdirectories', 'rows',
+                                                 'matched', 'unmatched'])
+
+
+def match_file(cursor, path, name):
+    """
+    Find the template of a file
+    :param cursor: PathCursor - cursor of the directory of the file
+    :param path: str - file path
+    :param name: str - normalized file name, see split_path
+    :return: str - template name, or None if no template matches
+    """
+    for template_name, template in cursor.child(name).candidates():
+        if template.validate_and_get_fields(path) is not None:
+            return template_name
+
+    return None
+
+
+def _classify_files(directory, files):
+    """
+    Match the files of a directory against the templates, in a classification process
+    :param directory: str - directory of the files
+    :param files: list of (file path, normalized name) tuples
+    :return: list of str - template name of each file, None if no template matches
+    """
+    cursor = _process_index.path_cursor()
+    for name in split_path(directory):
+        cursor = cursor.child(name)
+
+    return [match_file(cursor, path, name) for path, name in files]
+
+
+def audit_fingerprint(tk, ignore, include_matched):
+    """
+    Fingerprint of everything the stored results depend on besides the files themselves
+    :param tk: Sgtk - Toolkit instance whose templates are checked
+    :param ignore: list of str - ignored name patterns
+    :param include_matched: bool - matched files are stored as well
+    :return: str
+    """
+    definitions = sorted((name, str(getattr(t, 'root_path', '')), t.definition) for name, t in tk.templates.items())
+    return hashlib.sha1(json.dumps([definitions, sorted(ignore), include_matched]).encode()).hexdigest()
+
+
+class AuditStats(object):
+    """
+    Counters of an audit, updated by the workers
+    """
+
+    def __init__(self):
+        self.directories = 0
+        self.files = 0
+        self.matched = 0
+        self.unmatched = 0
+        self.errors = 0
+        self.unchanged = 0
+        self.changed = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {'directories': self.directories, 'files': self.files, 'matched': self.matched,
+                'unmatched': self.unmatched, 'errors': self.errors, 'unchanged': self.unchanged,
+                'changed': self.changed, 'elapsed': round(self.elapsed, 2)}
+
+
+class AuditState(object):
+    """
+    Results of the previous runs per directory, in a local SQLite database shared by the
+    workers. Writes are batched, a run stopped half way keeps the directories written so far.
+    """
+
+    def __init__(self, path, fingerprint):
+        """
+        Constructor
+        :param path: str - database file, created if needed
+        :param fingerprint: str - see audit_fingerprint, the stored results are dropped if it changed
+        """
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._removed = []
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER, '
+                         'entries INTEGER, digest TEXT, subdirectories TEXT, rows TEXT, matched INTEGER, '
+                         'unmatched INTEGER)')
+
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if not row or row[0] != fingerprint:
+            if row:
+                log.info(f'Templates or audit settings changed, dropping the stored audit results: {path}')
+            self._db.execute('DELETE FROM directories')
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+
+        self._db.commit()
+
+    def get(self, directory):
+        """
+        :param directory: str - directory path
+        :return: DirectoryRecord or None
+        """
+        with self._lock:
+            row = self._db.execute('SELECT mtime_ns, entries, digest, subdirectories, rows, matched, unmatched '
+                                   'FROM directories WHERE path = ?', (directory,)).fetchone()
+        if row is None:
+            return None
+
+        return DirectoryRecord(row[0], row[1], row[2], json.loads(row[3]), json.loads(row[4]), row[5], row[6])
+
+    def put(self, directory, record, removed=()):
+        """
+        Store the results of a directory
+        :param directory: str - directory path
+        :param record: DirectoryRecord
+        :param removed: list of str - subdirectories gone since the previous run, their results are deleted
+        :return: None
+        """
+        with self._lock:
+            self._pending.append((directory, record.mtime_ns, record.entries, record.digest,
+                                  json.dumps(record.subdirectories), json.dumps(record.rows), record.matched,
+                                  record.unmatched))
+            self._removed.extend(os.path.join(directory, name) for name in removed)
+
+            if len(self._pending) >= STATE_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        """
+        Write the pending results, call with the lock held
+        """
+        for path in self._removed:
+            prefix = os.path.join(path, '').replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            self._db.execute("DELETE FROM directories WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                             (path, prefix + '%'))
+
+        self._db.executemany('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self._pending)
+        self._db.commit()
+
+        self._pending = []
+        self._removed = []
+
+    def clear(self):
+        """
+        Drop the results of the previous runs, in the database so its WAL files go with them
+        :return: None
+        """
+        with self._lock:
+            self._pending = []
+            self._removed = []
+            self._db.execute('DELETE FROM directories')
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+
+class ReportWriter(object):
+    """
+    Thread safe streaming report, the rows of a directory are written at once
+    """
+
+    def __init__(self, stream, as_csv=False):
+        """
+        Constructor
+        :param stream: file object to write to
+        :param as_csv: bool - write CSV instead of JSON lines
+        """
+        self.stream = stream
+        self._lock = threading.Lock()
+
+        self._writer = None
+        if as_csv:
+            self._writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS, extrasaction='ignore')
+            self._writer.writeheader()
+
+    def write(self, rows):
+        """
+        :param rows: list of dict - REPORT_COLUMNS values
+        :return: None
+        """
+        if not rows:
+            return
+
+        with self._lock:
+            if self._writer:
+                self._writer.writerows(rows)
+            else:
+                self.stream.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+    def flush(self):
+        with self._lock:
+            self.stream.flush()
+
+
+class NamingAudit(object):
+    """
+    Walks a tree with a pool of os.scandir workers and classifies every file as matching a
+    template or not, in a pool of processes so the matching isn't held to one core by the GIL.
+
+    Directories are queued as they are found, so idle workers pick up whichever subtree is
+    next rather than waiting on a slow one. Each directory walks the path trie of the template
+    index once, its files only test the last component and the few templates left, and a
+    subtree no template can reach is listed without testing anything.
+    """
+
+    def __init__(self, tk, workers=DEFAULT_WORKERS, ignore=None, include_matched=False, state_path=None,
+                 full=False, processes=DEFAULT_PROCESSES):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance whose templates are checked
+        :param workers: int - directories listed at once
+        :param ignore: list of str - file/directory name patterns skipped ie: .*
+        :param include_matched: bool - report matching files as well, with their template
+        :param state_path: str - SQLite database of the results of previous runs, None to check everything
+        :param full: bool - drop the results of the previous runs and check every directory again
+        :param processes: int - processes matching files against the templates, 0 for one per CPU, 1 to match
+                          them on the listing threads (always the case where processes can't be forked)
+        """
+        self.tk = tk
+        self.index = get_template_index(tk)
+        self.workers = max(1, workers)
+        self.ignore = DEFAULT_IGNORE if ignore is None else ignore
+        self.include_matched = include_matched
+        self.state_path = state_path
+        self.full = full
+        self.processes = processes or os.cpu_count() or 1
+
+        self._lock = threading.Lock()
+        self._state = None
+        self._racy_ns = 0
+        self._pool = None
+
+    def _ignored(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    def _start_pool(self):
+        """
+        Fork the classification processes, before any listing thread runs so that none of
+        their locks is copied while held
+        """
+        global _process_index
+
+        if self.processes < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+            log.debug('Matching the audited files on the listing threads')
+            return
+
+        _process_index = self.index
+        self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork'))
+        # Forks every process now rather than on the first directory
+        self._pool.submit(os.getpid).result()
+
+    def _classify(self, directory, cursor, files):
+        """
+        :param directory: str - directory of the files
+        :param cursor: PathCursor - cursor of the directory
+        :param files: list of (file path, normalized name) tuples
+        :return: list of str - template name of each file, None if no template matches
+        """
+        if cursor.dead or not files:
+            return [None] * len(files)
+
+        if self._pool is not None:
+            return self._pool.submit(_classify_files, directory, files).result()
+
+        return [match_file(cursor, path, name) for path, name in files]
+
+    def _scan_directory(self, directory, cursor):
+        """
+        List and classify the files of a directory
+        :return: tuple - (entries, list of sub directory names, list of report rows, matched, unmatched)
+        """
+        subdirectories = []
+        files = []
+        rows = []
+        matched = unmatched = 0
+
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+
+        for entry in entries:
+            if self._ignored(entry.name):
+                continue
+
+            name = os.path.normcase(entry.name)
+
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                    continue
+
+                if not entry.is_file():
+                    continue
+
+            except OSError as err:
+                rows.append({'status': STATUS_ERROR, 'path': entry.path, 'template': None, 'error': str(err)})
+                continue
+
+            files.append((entry.path, name))
+
+        for (path, _), template_name in zip(files, self._classify(directory, cursor, files)):
+            if template_name is None:
+                unmatched += 1
+                rows.append({'status': STATUS_UNMATCHED, 'path': path, 'template': None, 'error': None})
+            else:
+                matched += 1
+                if self.include_matched:
+                    rows.append({'status': STATUS_MATCHED, 'path': path, 'template': template_name,
+                                 'error': None})
+
+        return len(entries), subdirectories, rows, matched, unmatched
+
+    def _audit_directory(self, directory, cursor, stats):
+        """
+        Classify the files of a directory, reusing the stored results if it hasn't changed
+        :return: tuple - (list of (sub directory, PathCursor), list of report rows)
+        """
+        try:
+            record = None
+            if self._state:
+                mtime_ns = os.stat(directory).st_mtime_ns
+                record = self._state.get(directory)
+
+            if record is not None and record.mtime_ns == mtime_ns:
+                names, rows, matched, unmatched = record.subdirectories, record.rows, record.matched, record.unmatched
+                unchanged = True
+
+            else:
+                entries, names, rows, matched, unmatched = self._scan_directory(directory, cursor)
+                unchanged = False
+
+                if self._state:
+                    digest = hashlib.sha1(json.dumps(rows).encode()).hexdigest()
+                    # Not trusted until a run starts after the directory settled
+                    stored_mtime = -1 if mtime_ns >= self._racy_ns else mtime_ns
+                    removed = set(record.subdirectories) - set(names) if record else ()
+                    self._state.put(directory, DirectoryRecord(stored_mtime, entries, digest, names, rows,
+                                                               matched, unmatched), removed)
+                    changed = record is None or record.digest != digest
+
+        except OSError as err:
+            with self._lock:
+                stats.errors += 1
+            return [], [{'status': STATUS_ERROR, 'path': directory, 'template': None, 'error': str(err)}]
+
+        with self._lock:
+            stats.directories += 1
+            stats.files += matched + unmatched
+            stats.matched += matched
+            stats.unmatched += unmatched
+            stats.errors += sum(1 for r in rows if r['status'] == STATUS_ERROR)
+            if unchanged:
+                stats.unchanged += 1
+            elif self._state and changed:
+                stats.changed += 1
+
+        return [(os.path.join(directory, n), cursor.child(os.path.normcase(n))) for n in names], rows
+
+    def run(self, root, report, progress_callback=None, cancel_event=None):
+        """
+        Audit a tree
+        :param root: str - shot, sequence or project directory
+        :param report: ReportWriter - receives the rows as directories are done
+        :param progress_callback: callable - called with the AuditStats every PROGRESS_INTERVAL seconds
+        :param cancel_event: threading.Event - set it to stop, the report holds the directories done
+        :return: AuditStats
+        """
+        cancel_event = cancel_event or threading.Event()
+        stats = AuditStats()
+        start = time.monotonic()
+
+        if self.state_path:
+            self._state = AuditState(self.state_path, audit_fingerprint(self.tk, self.ignore, self.include_matched))
+            if self.full:
+                self._state.clear()
+            self._racy_ns = time.time_ns() - RACY_WINDOW_NS
+
+        root = os.path.abspath(root)
+        cursor = self.index.path_cursor()
+        for name in split_path(root):
+            cursor = cursor.child(name)
+
+        directories = queue.Queue()
+        directories.put((root, cursor))
+        errors = []
+
+        def work():
+            while True:
+                item = directories.get()
+                if item is None:
+                    return
+
+                try:
+                    if not cancel_event.is_set():
+                        subdirectories, rows = self._audit_directory(item[0], item[1], stats)
+                        for subdirectory in subdirectories:
+                            directories.put(subdirectory)
+                        report.write(rows)
+
+                except BaseException as err:
+                    errors.append(err)
+                    cancel_event.set()
+
+                finally:
+                    directories.task_done()
+
+        self._start_pool()
+
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        # Queue.join can't time out, a helper thread lets the progress be reported meanwhile
+        done = threading.Event()
+        threading.Thread(target=lambda: (directories.join(), done.set()), daemon=True).start()
+        while not done.wait(PROGRESS_INTERVAL):
+            stats.elapsed = time.monotonic() - start
+            if progress_callback:
+                progress_callback(stats)
+
+        for _ in threads:
+            directories.put(None)
+        for thread in threads:
+            thread.join()
+
+        report.flush()
+        stats.elapsed = time.monotonic() - start
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        if self._state:
+            self._state.close()
+            self._state = None
+
+        if errors:
+            raise errors[0]
+
+        log.info(f'Audited {stats.files} files in {stats.directories} directories in {stats.elapsed:.1f}s '
+                 f'({stats.files / max(stats.elapsed, 1e-6):.0f} files/s): {stats.matched} matched, '
+                 f'{stats.unmatched} unmatched, {stats.errors} errors, {stats.unchanged} directories unchanged, '
+                 f'{stats.changed} with new results, index {self.index.stats()}')
+
+        return stats
+
+
+def run_command(app_instance, *args):
+    """
+    Command callback: audit_naming <root> [report.csv|report.jsonl] [--matched] [--full]
+    Without a report path, the unmatched files are written to stdout as JSON lines.
+    --full drops the results of the previous runs and checks every directory again.
+    :param app_instance: Application
+    :return: None
+    """
+    args = list(args)
+    include_matched = '--matched' in args
+    full = '--full' in args
+    args = [a for a in args if a not in ('--matched', '--full')]
+
+    if not args:
+        log.error('Usage: audit_naming <root directory> [report.csv|report.jsonl] [--matched] [--full]')
+        return
+
+    root = args[0]
+    report_path = args[1] if len(args) > 1 else None
+
+    audit = NamingAudit(app_instance.sgtk,
+                        app_instance.get_setting("audit_workers"),
+                        app_instance.get_setting("audit_ignore"),
+                        include_matched,
+                        os.path.join(app_instance.cache_location, STATE_FILE_NAME),
+                        full,
+                        app_instance.get_setting("audit_processes"))
+
+    def progress(stats):
+        log.info(f'Audited {stats.files} files in {stats.directories} directories ({stats.unchanged} unchanged), '
+                 f'{stats.unmatched} unmatched ({stats.elapsed:.0f}s)')
+
+    if report_path:
+        with open(report_path, 'w', newline='') as stream:
+            audit.run(root, ReportWriter(stream, report_path.lower().endswith('.csv')), progress)
+    else:
+        audit.run(root, ReportWriter(sys.stdout), progress)
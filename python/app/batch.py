@@ -0,0 +1,288 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Batch resolution of template paths from a CSV or JSON manifest.
+
+Manifest columns:
+    entity_type - Shotgun entity type ie: Shot (optional when task is a Task id)
+    entity_id   - Shotgun entity id (optional when task is a Task id)
+    task        - Task id, or the Task name on the entity ie: anim
+    engine      - tk-engines key (ie: Maya) or engine name (ie: tk-maya)
+    template    - Toolkit template name ie: shot_maya_work
+    tokens      - dict of extra token values. In CSV manifests this is a JSON string and
+                  every other column is used as a token as well ie: name,version
+
+CSV manifests are detected by the .csv extension, anything else is read as a JSON list
+or as JSON lines. Results are streamed as JSON lines, or as CSV when writing to a .csv file.
+"""
+
+import csv
+import json
+import sys
+import time
+
+import sgtk
+from tank import TankError
+
+from . import resolver
+
+log = sgtk.platform.get_logger(__name__)
+
+MANIFEST_COLUMNS = ('entity_type', 'entity_id', 'task', 'engine', 'template', 'tokens')
+RESULT_COLUMNS = ('entity_type', 'entity_id', 'task', 'engine', 'template', 'file_name', 'directory', 'file_path',
+                  'error')
+
+
+def read_manifest(path):
+    """
+    Read the rows of a manifest file one at a time
+    :param path: str - CSV or JSON manifest path
+    :return: generator of dict
+    """
+    with open(path, newline='') as handle:
+        if path.lower().endswith('.csv'):
+            for row in csv.DictReader(handle):
+                tokens = json.loads(row['tokens']) if row.get('tokens') else {}
+                tokens.update((k, v) for k, v in row.items() if k not in MANIFEST_COLUMNS and v not in (None, ''))
+                row = dict((k, row.get(k)) for k in MANIFEST_COLUMNS if k != 'tokens')
+                row['tokens'] = tokens
+                yield row
+            return
+
+        first_char = handle.read(1)
+        while first_char and first_char.isspace():
+            first_char = handle.read(1)
+        handle.seek(0)
+
+        if first_char == '[':
+            for row in json.load(handle):
+                yield row
+
+        else:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def write_results(results, stream, as_csv=False):
+    """
+    Write resolved rows as they are produced
+    :param results: iterable of dict - rows from BatchResolver.resolve_rows
+    :param stream: file object to write to
+    :param as_csv: bool - write CSV instead of JSON lines
+    :return: tuple - (rows written, rows with errors)
+    """
+    count = 0
+    errors = 0
+
+    writer = None
+    if as_csv:
+        writer = csv.DictWriter(stream, fieldnames=RESULT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+
+    for result in results:
+        if writer:
+            writer.writerow(result)
+        else:
+            stream.write(json.dumps(result) + '\n')
+
+        count += 1
+        if result.get('error'):
+            errors += 1
+
+    stream.flush()
+    return count, errors
+
+
+class BatchResolver(object):
+    """
+    Resolves many manifest rows, sharing contexts, registrations, Task lookups and context
+    fields between rows so the per-row cost is a few dictionary lookups.
+    """
+
+    def __init__(self, tk, engines, entity_remap=None, register=True, context_cache=None):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance
+        :param engines: dict - tk-engines setting, used to map display names to engine names
+        :param entity_remap: dict - custom_entity_name_remap setting
+        :param register: bool - create the folder structure of contexts not yet registered
+        :param context_cache: ContextCache - expiring cache for the contexts, instead of keeping them for good
+        """
+        self.tk = tk
+        self.engines = engines or {}
+        self.register = register
+        self.context_cache = context_cache
+        self.resolver = resolver.PathResolver(tk, entity_remap)
+
+        self._contexts = {}
+        self._registered = set()
+        self._task_ids = {}
+        self._fields = {}
+
+    def resolve_rows(self, rows):
+        """
+        Resolve manifest rows, errors are reported per row rather than raised
+        :param rows: iterable of dict - manifest rows
+        :return: generator of dict - RESULT_COLUMNS values for each row
+        """
+        for row in rows:
+            result = dict((k, row.get(k)) for k in RESULT_COLUMNS)
+
+            try:
+                resolved = self.resolve_row(row)
+                result['file_name'] = resolved.file_name
+                result['directory'] = resolved.directory
+                result['file_path'] = resolved.file_path
+
+            except Exception as err:
+                result['error'] = str(err)
+                log.warning(f'Failed to resolve manifest row {row}: {err}')
+
+            yield result
+
+    def resolve_row(self, row, frame=1):
+        """
+        Resolve a single manifest row
+        :param row: dict - manifest row
+        :param frame: int - value used to fill in any frame padding
+        :return: ResolvedPath
+        """
+        engine = self.engine_name(row.get('engine'))
+        typ, idd = self.row_entity(row)
+        context = self.get_context(typ, idd, engine)
+
+        template = self.resolver.get_template(row.get('template'))
+
+        fields_key = (typ, idd, template.name)
+        fields = self._fields.get(fields_key)
+        if fields is None:
+            fields = self.resolver.context_fields(context, template)
+            self._fields[fields_key] = fields
+
+        return self.resolver.resolve_fields(template, fields, row.get('tokens'), frame)
+
+    def engine_name(self, engine):
+        """
+        Map a tk-engines display name to its engine name, engine names are returned as is
+        :param engine: str
+        :return: str
+        """
+        if not engine:
+            raise TankError('No engine defined')
+
+        return self.engines.get(engine) or engine
+
+    def row_entity(self, row):
+        """
+        Get the entity a row should be registered and resolved for
+        :param row: dict - manifest row
+        :return: tuple - (entity type, entity id)
+        """
+        task = row.get('task')
+        if task not in (None, ''):
+            task = str(task)
+            if task.isdigit():
+                return 'Task', int(task)
+
+        entity_type = row.get('entity_type')
+        entity_id = row.get('entity_id')
+        if not entity_type or entity_id in (None, ''):
+            raise TankError('Row needs a Task id or an entity_type and entity_id')
+
+        entity_id = int(entity_id)
+
+        if not task:
+            return entity_type, entity_id
+
+        task_ids = self._task_ids.get((entity_type, entity_id))
+        if task_ids is None:
+            # One query per entity returns all of its Tasks for the following rows
+            tasks = self.tk.shotgun.find('Task', [['entity', 'is', {'type': entity_type, 'id': entity_id}]],
+                                         ['content'])
+            task_ids = dict((t['content'], t['id']) for t in tasks)
+            self._task_ids[(entity_type, entity_id)] = task_ids
+
+        if task not in task_ids:
+            raise TankError(f'Task "{task}" not found on {entity_type} {entity_id}')
+
+        return 'Task', task_ids[task]
+
+    def get_context(self, typ, idd, engine):
+        """
+        Get the context of an entity, registering it with Toolkit on first use
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :param engine: str - engine name used for folder creation
+        :return: Context
+        """
+        if self.context_cache is not None:
+            if self.register and not self.context_cache.paths_from_entity(typ, idd):
+                log.info(f'Creating folder structure on disk for {typ} {idd}')
+                self.context_cache.create_filesystem_structure(typ, idd, engine=engine)
+
+            return self.context_cache.context_from_entity(typ, idd)
+
+        if self.register and (typ, idd, engine) not in self._registered:
+            if not self.tk.paths_from_entity(typ, idd):
+                log.info(f'Creating folder structure on disk for {typ} {idd}')
+                self.tk.create_filesystem_structure(typ, idd, engine=engine)
+                self._contexts.pop((typ, idd), None)
+
+            self._registered.add((typ, idd, engine))
+
+        context = self._contexts.get((typ, idd))
+        if context is None:
+            context = self.tk.context_from_entity(typ, idd)
+            self._contexts[(typ, idd)] = context
+
+        return context
+
+
+def run_command(app_instance, *args):
+    """
+    Command callback: resolve_paths <manifest> [output]
+    Without an output path, results are written to stdout as JSON lines.
+    :param app_instance: Application
+    :return: None
+    """
+    manifest_path = args[0] if args else None
+    output_path = args[1] if len(args) > 1 else None
+
+    if not manifest_path and app_instance.engine.has_ui:
+        from sgtk.platform.qt import QtGui
+        manifest_path = QtGui.QFileDialog.getOpenFileName(None, 'Select Manifest', '',
+                                                          'Manifests (*.csv *.json *.jsonl)')[0]
+        if manifest_path:
+            output_path = QtGui.QFileDialog.getSaveFileName(None, 'Save Resolved Paths', '',
+                                                            'CSV (*.csv);;JSON Lines (*.jsonl)')[0]
+
+    if not manifest_path:
+        log.error('Usage: resolve_paths <manifest.csv|manifest.json> [output.csv|output.jsonl]')
+        return
+
+    batch = BatchResolver(app_instance.sgtk,
+                          app_instance.get_setting("tk-engines"),
+                          app_instance.get_setting("custom_entity_name_remap"))
+
+    start = time.time()
+    results = batch.resolve_rows(read_manifest(manifest_path))
+
+    if output_path:
+        with open(output_path, 'w', newline='') as stream:
+            count, errors = write_results(results, stream, output_path.lower().endswith('.csv'))
+    else:
+        count, errors = write_results(results, sys.stdout)
+
+    elapsed = time.time() - start
+    log.info(f'Resolved {count} manifest rows ({errors} errors) in {elapsed:.2f}s '
+             f'({count / max(elapsed, 1e-6):.0f} rows/s)')
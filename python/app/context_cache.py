@@ -0,0 +1,185 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+import time
+from collections import OrderedDict
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+
+class TTLCache(object):
+    """
+    Thread safe, size bounded (least recently used first out) cache whose entries expire after a TTL
+    """
+
+    def __init__(self, ttl=300, max_size=256):
+        """
+        Constructor
+        :param ttl: float - seconds an entry stays valid, 0 disables the cache
+        :param max_size: int - maximum number of entries
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        :param key: hashable
+        :param default: value returned if the key isn't cached or has expired
+        :return: cached value or default
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                if time.monotonic() - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+
+                del self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+        :param key: hashable
+        :param value: value to cache
+        :return: None
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """
+        Invalidate a single entry
+        :param key: hashable
+        :return: None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class ContextCache(object):
+    """
+    Per session cache of the Toolkit path cache and context lookups of entities.
+
+    Switching application within a context re-uses the paths and context fetched seconds
+    earlier instead of querying the path cache and Shotgun again. Entries expire after the
+    context_cache_ttl setting and are invalidated whenever the folder structure of the entity
+    is created through create_filesystem_structure().
+    """
+
+    def __init__(self, tk, ttl=300, max_size=256):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance
+        :param ttl: float - seconds an entry stays valid, 0 disables the cache
+        :param max_size: int - maximum number of entities cached
+        """
+        self.tk = tk
+        self._paths = TTLCache(ttl, max_size)
+        self._contexts = TTLCache(ttl, max_size)
+
+    def paths_from_entity(self, typ, idd):
+        """
+        Cached Sgtk.paths_from_entity
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :return: list of str
+        """
+        paths = self._paths.get((typ, idd))
+        if paths is None:
+            paths = self.tk.paths_from_entity(typ, idd)
+            self._paths.set((typ, idd), paths)
+
+        return paths
+
+    def context_from_entity(self, typ, idd):
+        """
+        Cached Sgtk.context_from_entity
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :return: Context
+        """
+        context = self._contexts.get((typ, idd))
+        if context is None:
+            context = self.tk.context_from_entity(typ, idd)
+            self._contexts.set((typ, idd), context)
+
+        return context
+
+    def create_filesystem_structure(self, typ, idd, engine=None):
+        """
+        Sgtk.create_filesystem_structure, invalidating what is cached for the entity
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :param engine: str - engine used for deferred folder creation
+        :return: int - number of folders processed
+        """
+        try:
+            return self.tk.create_filesystem_structure(typ, idd, engine=engine)
+
+        finally:
+            self.invalidate(typ, idd)
+
+    def registered_context(self, typ, idd):
+        """
+        Get the context of an entity only if it is cached and known to be registered,
+        without any path cache or Shotgun query
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :return: Context or None
+        """
+        if not self._paths.get((typ, idd)):
+            return None
+
+        return self._contexts.get((typ, idd))
+
+    def invalidate(self, typ=None, idd=None):
+        """
+        Invalidate the cache of an entity, or everything if no entity is given
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :return: None
+        """
+        if typ is None:
+            self._paths.clear()
+            self._contexts.clear()
+            return
+
+        self._paths.pop((typ, idd))
+        self._contexts.pop((typ, idd))
+
+    def stats(self):
+        return {'paths': self._paths.stats(), 'contexts': self._contexts.stats()}
@@ -0,0 +1,1179 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+File copy engine used by "Copy File to File Path". Headless, safe to run in worker threads.
+"""
+
+import contextlib
+import copy
+import errno
+import hashlib
+import json
+import mmap
+import os
+import sys
+import zlib
+import threading
+import time
+import uuid
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Minimum seconds between two progress callbacks
+PROGRESS_INTERVAL = 0.1
+
+METHOD_AUTO = 'auto'
+METHOD_COPY_FILE_RANGE = 'copy_file_range'
+METHOD_SENDFILE = 'sendfile'
+METHOD_READWRITE = 'readwrite'
+METHODS = (METHOD_AUTO, METHOD_COPY_FILE_RANGE, METHOD_SENDFILE, METHOD_READWRITE)
+
+# Reported by copy_many when the source was read once for several destinations
+METHOD_FAN_OUT = 'fan-out'
+
+# Chunks are rounded up to a multiple of this, buffers are page aligned
+BUFFER_ALIGNMENT = 64 * 1024
+
+# With drop_cache, written data is dropped from the page cache once it is this far behind the copy
+DROP_CACHE_WINDOW = 64 * 1024 * 1024
+
+# Errors meaning a transfer method isn't supported for these files, try the next one
+FALLBACK_ERRNOS = set(getattr(errno, name) for name in ('EXDEV', 'ENOSYS', 'EINVAL', 'ENOTSUP', 'EOPNOTSUPP',
+                                                        'ENOTSOCK', 'EBADF', 'ETXTBSY') if hasattr(errno, name))
+
+
+# Skip copies over identical destinations: never, same size and modification time,
+# or same size, modification time and content hash
+SKIP_OFF = 'off'
+SKIP_QUICK = 'quick'
+SKIP_HASH = 'hash'
+SKIP_MODES = (SKIP_OFF, SKIP_QUICK, SKIP_HASH)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Content digests by (path, size, mtime, inode), re-checking an unchanged file costs a stat
+_DIGESTS = {}
+_DIGESTS_LOCK = threading.Lock()
+_DIGESTS_MAX = 4096
+
+
+# How a file gets to its destination: auto reflinks on the same volume when the filesystem
+# supports it and copies otherwise, hardlink/symlink share the source data instead of copying
+STRATEGY_AUTO = 'auto'
+STRATEGY_REFLINK = 'reflink'
+STRATEGY_HARDLINK = 'hardlink'
+STRATEGY_SYMLINK = 'symlink'
+STRATEGY_COPY = 'copy'
+STRATEGIES = (STRATEGY_AUTO, STRATEGY_REFLINK, STRATEGY_HARDLINK, STRATEGY_SYMLINK, STRATEGY_COPY)
+
+# linux/fs.h _IOW(0x94, 9, int), shares the extents of a file on btrfs, XFS, OCFS2, bcachefs...
+FICLONE = 0x40049409
+
+
+# Checksum computed while the data streams through: fast (xxh3 when the xxhash module is
+# installed, crc32 otherwise) or sha256
+CHECKSUM_OFF = 'off'
+CHECKSUM_FAST = 'fast'
+CHECKSUM_SHA256 = 'sha256'
+CHECKSUMS = (CHECKSUM_OFF, CHECKSUM_FAST, CHECKSUM_SHA256)
+
+# Verification of the written file before it replaces the destination: a hash of a few
+# blocks spread over the file compared with the same blocks of the source, or a full re-read
+VERIFY_OFF = 'off'
+VERIFY_SAMPLED = 'sampled'
+VERIFY_FULL = 'full'
+VERIFY_MODES = (VERIFY_OFF, VERIFY_SAMPLED, VERIFY_FULL)
+
+VERIFY_SAMPLES = 16
+VERIFY_SAMPLE_SIZE = 64 * 1024
+
+# Resumable copies sync the partial file and journal its size every RESUME_CHECKPOINT bytes
+RESUME_CHECKPOINT = 256 * 1024 * 1024
+RESUME_MAX_BACKOFF = 30
+
+# Errors of a flaky network mount, worth retrying a resumable copy for
+RETRY_ERRNOS = set(getattr(errno, name) for name in ('EIO', 'ESTALE', 'ETIMEDOUT', 'ENOTCONN', 'ECONNRESET',
+                                                     'ECONNABORTED', 'EHOSTDOWN', 'EHOSTUNREACH', 'ENETDOWN',
+                                                     'ENETUNREACH', 'EAGAIN') if hasattr(errno, name))
+
+
+CopyResult = namedtuple('CopyResult', ['src', 'dst', 'size', 'elapsed', 'method', 'skipped', 'digest'],
+                        defaults=(False, None))
+
+
+class CopyCancelled(Exception):
+    """
+    Raised when a copy is cancelled, the partial destination has been removed
+    """
+
+
+class CopyVerificationError(Exception):
+    """
+    Raised when the copied data doesn't match the source, the destination was left untouched
+    """
+
+
+class _Crc32(object):
+    """
+    hashlib like interface for zlib.crc32
+    """
+    name = 'crc32'
+
+    def __init__(self):
+        self._value = 0
+
+    def update(self, data):
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self):
+        return f'{self._value:08x}'
+
+
+def new_hasher(checksum):
+    """
+    :param checksum: str - CHECKSUM_FAST or CHECKSUM_SHA256
+    :return: hasher with update() and hexdigest() methods and a name attribute
+    """
+    if checksum == CHECKSUM_SHA256:
+        return hashlib.sha256()
+
+    if xxhash is not None:
+        return xxhash.xxh3_64()
+
+    return _Crc32()
+
+
+def hasher_name(hasher):
+    """
+    :return: str - short algorithm name used for sidecar file extensions ie: sha256, xxh3_64, crc32
+    """
+    return hasher.name.replace('XXH3_64', 'xxh3_64').lower()
+
+
+def compute_digest(path, checksum):
+    """
+    Full hash of a file
+    :param path: str - file path
+    :param checksum: str - CHECKSUM_FAST or CHECKSUM_SHA256
+    :return: str - hex digest
+    """
+    hasher = new_hasher(checksum)
+    buf = bytearray(HASH_CHUNK_SIZE)
+    with open(path, 'rb', buffering=0) as handle:
+        while True:
+            read = handle.readinto(buf)
+            if not read:
+                break
+            hasher.update(memoryview(buf)[:read])
+
+    return hasher.hexdigest()
+
+
+def sampled_digest(path, size, samples=VERIFY_SAMPLES, sample_size=VERIFY_SAMPLE_SIZE, offset=0):
+    """
+    Hash of a few blocks spread evenly over a file (or a range of it), including its first and last block.
+    Catches truncated, misplaced and zeroed out writes at a fraction of a full read.
+    :param path: str - file path
+    :param size: int - file size, or size of the range
+    :param samples: int - number of blocks read
+    :param sample_size: int - bytes per block
+    :param offset: int - start of the range
+    :return: str - hex digest
+    """
+    hasher = hashlib.blake2b()
+    hasher.update(str(size).encode())
+
+    with open(path, 'rb', buffering=0) as handle:
+        if size <= samples * sample_size:
+            handle.seek(offset)
+            hasher.update(handle.read(size))
+            return hasher.hexdigest()
+
+        step = (size - sample_size) / (samples - 1)
+        for index in range(samples):
+            handle.seek(offset + int(index * step))
+            hasher.update(handle.read(sample_size))
+
+    return hasher.hexdigest()
+
+
+def resume_path(src, dst):
+    """
+    Partial file of a resumable copy, the same for every attempt of a source to a destination
+    :param src: str - source file path
+    :param dst: str - destination file path
+    :return: str - ie: /dir/.file.exr.1a2b3c4d.resume.part
+    """
+    directory, name = os.path.split(dst)
+    key = zlib.crc32(os.path.abspath(src).encode('utf-8'))
+    return os.path.join(directory, f'.{name}.{key:08x}.resume.part')
+
+
+class ResumeJournal(object):
+    """
+    Journal of the data of a partial file known to be on disk.
+
+    The first line identifies the source (path, size, mtime), each following line is an
+    offset up to which the partial file was synced. On resume the last range is checked
+    against the source before the copy carries on from its end.
+    """
+
+    def __init__(self, path, src, src_stat):
+        """
+        Constructor
+        :param path: str - journal file path
+        :param src: str - source file path
+        :param src_stat: os.stat_result - stat of the source
+        """
+        self.path = path
+        self.src = src
+        self.header = {'src': os.path.abspath(src), 'size': src_stat.st_size, 'mtime_ns': src_stat.st_mtime_ns}
+
+    def resume_offset(self, partial_path):
+        """
+        Offset the copy can safely carry on from
+        :param partial_path: str - partial destination file
+        :return: int - 0 if nothing can be resumed
+        """
+        try:
+            with open(self.path) as handle:
+                lines = handle.read().splitlines()
+            partial_size = os.path.getsize(partial_path)
+        except OSError:
+            return 0
+
+        try:
+            if not lines or json.loads(lines[0]) != self.header:
+                return 0
+            offsets = sorted(set(int(line) for line in lines[1:] if line.strip()))
+        except ValueError:
+            # Journal line torn by the interruption
+            return 0
+
+        offsets = [o for o in offsets if o <= partial_size]
+
+        # Check the last synced ranges against the source, newest first
+        for index in range(len(offsets) - 1, -1, -1):
+            end = offsets[index]
+            begin = offsets[index - 1] if index else 0
+            if sampled_digest(self.src, end - begin, offset=begin) == \
+                    sampled_digest(partial_path, end - begin, offset=begin):
+                return end
+
+            log.warning(f'Resume journal range {begin}-{end} does not match the source: {partial_path}')
+
+        return 0
+
+    def start(self):
+        """
+        Start a new journal, discarding any previous one
+        """
+        with open(self.path, 'w') as handle:
+            handle.write(json.dumps(self.header) + '\n')
+
+    def checkpoint(self, fdst, offset):
+        """
+        Sync the partial file and record that everything before offset is on disk
+        :param fdst: FileIO - partial file
+        :param offset: int
+        """
+        os.fsync(fdst.fileno())
+        with open(self.path, 'a') as handle:
+            handle.write(f'{offset}\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def write_sidecar(path, digest, algorithm):
+    """
+    Write a checksum file next to a file, in the format of the sha256sum family of tools
+    :param path: str - file the digest belongs to
+    :param digest: str - hex digest
+    :param algorithm: str - used as extension ie: /dir/file.exr.sha256
+    :return: str - sidecar path
+    """
+    sidecar = f'{path}.{algorithm}'
+    tmp = temp_path(sidecar)
+    with open(tmp, 'w') as handle:
+        handle.write(f'{digest}  {os.path.basename(path)}\n')
+    os.replace(tmp, sidecar)
+
+    return sidecar
+
+
+def format_size(size):
+    """
+    :param size: int - number of bytes
+    :return: str - human readable size ie: 1.5 GB
+    """
+    size = float(size)
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if size < 1024 or unit == 'TB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size:.0f} B'
+        size /= 1024
+
+
+def format_duration(seconds):
+    """
+    :param seconds: float
+    :return: str - ie: 1h 02m, 3m 12s, 8s
+    """
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m {seconds % 60:02d}s'
+    return f'{seconds}s'
+
+
+def transfer_rate(copied, total, elapsed):
+    """
+    Throughput and estimated time left of a transfer
+    :param copied: int - bytes copied so far
+    :param total: int - total bytes
+    :param elapsed: float - seconds since the transfer started
+    :return: tuple - (bytes per second, seconds left or None if unknown)
+    """
+    if elapsed <= 0 or copied <= 0:
+        return 0.0, None
+
+    rate = copied / elapsed
+    return rate, max(total - copied, 0) / rate
+
+
+def aligned_size(size):
+    """
+    :param size: int - bytes
+    :return: int - size rounded up to a multiple of BUFFER_ALIGNMENT
+    """
+    return max(1, -(-size // BUFFER_ALIGNMENT)) * BUFFER_ALIGNMENT
+
+
+def aligned_buffer(size):
+    """
+    Page aligned buffer, large aligned transfers map onto whole filesystem blocks/RAID stripes
+    :param size: int - bytes, rounded up to a multiple of BUFFER_ALIGNMENT
+    :return: mmap - anonymous writable memory
+    """
+    return mmap.mmap(-1, aligned_size(size))
+
+
+def preallocate(fd, size):
+    """
+    Reserve the space of a file before writing it so it is laid out in as few extents as possible
+    :param fd: int - file descriptor opened for writing
+    :param size: int - final file size
+    :return: bool - False if the platform or filesystem doesn't support it
+    """
+    if size <= 0 or not hasattr(os, 'posix_fallocate'):
+        return False
+
+    try:
+        os.posix_fallocate(fd, 0, size)
+        return True
+
+    except OSError as err:
+        log.debug(f'Preallocation not supported ({err})')
+        return False
+
+
+def advise(fd, offset, length, advice_name):
+    """
+    posix_fadvise where available, a hint that is silently skipped elsewhere
+    :param fd: int - file descriptor
+    :param offset: int - start of the range
+    :param length: int - length of the range, 0 up to the end of the file
+    :param advice_name: str - os constant name ie: POSIX_FADV_DONTNEED
+    :return: None
+    """
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def same_device(src, dst):
+    """
+    Check if a file and a destination path are on the same volume
+    :param src: str - existing file path
+    :param dst: str - destination path, it doesn't have to exist but its directory must
+    :return: bool
+    """
+    try:
+        return os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    except OSError:
+        return False
+
+
+def volume_id(path):
+    """
+    Identify the volume a path is on, or would be on once created
+    :param path: str - file or directory path, it doesn't have to exist
+    :return: int - st_dev of the path or of its closest existing parent
+    """
+    path = os.path.abspath(path)
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def temp_path(path):
+    """
+    Hidden temporary file next to a path, on the same volume so it can be renamed over it
+    :param path: str - final file path
+    :return: str - ie: /dir/.file.exr.1a2b3c4d.part
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.{uuid.uuid4().hex[:8]}.part')
+
+
+def file_digest(path, stat=None):
+    """
+    Content hash of a file, cached for as long as the file's size, mtime and inode don't change
+    :param path: str - file path
+    :param stat: os.stat_result - stat of the file if already known
+    :return: str - hex digest
+    """
+    stat = stat or os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    with _DIGESTS_LOCK:
+        digest = _DIGESTS.get(key)
+    if digest:
+        return digest
+
+    hasher = hashlib.blake2b()
+    buf = bytearray(HASH_CHUNK_SIZE)
+    with open(path, 'rb', buffering=0) as handle:
+        while True:
+            read = handle.readinto(buf)
+            if not read:
+                break
+            hasher.update(memoryview(buf)[:read])
+    digest = hasher.hexdigest()
+
+    with _DIGESTS_LOCK:
+        if len(_DIGESTS) >= _DIGESTS_MAX:
+            _DIGESTS.clear()
+        _DIGESTS[key] = digest
+
+    return digest
+
+
+def files_identical(src, dst, compare_content=True):
+    """
+    Check if dst already holds the same data as src
+    :param src: str - source file path
+    :param dst: str - destination file path
+    :param compare_content: bool - also compare content hashes, not only size and modification time
+    :return: bool
+    """
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+
+    if src_stat.st_size != dst_stat.st_size or src_stat.st_mtime_ns != dst_stat.st_mtime_ns:
+        return False
+
+    if not compare_content:
+        return True
+
+    return file_digest(src, src_stat) == file_digest(dst, dst_stat)
+
+
+class ProgressAggregator(object):
+    """
+    Sums the progress of files copied in parallel into a single callback
+    """
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.callback = callback
+        self.start = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._files = {}
+        self._copied = 0
+        self._last_report = 0.0
+
+    def file_callback(self, key):
+        def update(copied, total, elapsed):
+            with self._lock:
+                self._copied += copied - self._files.get(key, 0)
+                self._files[key] = copied
+
+                now = time.monotonic()
+                if now - self._last_report < PROGRESS_INTERVAL:
+                    return
+                self._last_report = now
+                copied_total = self._copied
+
+            if self.callback:
+                self.callback(copied_total, self.total, now - self.start)
+
+        return update
+
+    @property
+    def copied(self):
+        return self._copied
+
+
+class FileCopier(object):
+    """
+    Copies a file in chunks, reporting progress and honouring cancellation between chunks.
+
+    The data is moved with the fastest method the platform offers: copy_file_range (in
+    kernel, server side on NFS 4.2/SMB3), then sendfile (in kernel), then a user space
+    read/write loop. A method that fails with an "unsupported" error falls back to the
+    next one, carrying on from the current offset.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, method=METHOD_AUTO, atomic=True, skip_identical=SKIP_HASH,
+                 strategy=STRATEGY_AUTO, checksum=CHECKSUM_OFF, verify=VERIFY_OFF, sidecar=False,
+                 resume_min_size=None, retries=3, scheduler=None, preallocate=False, drop_cache=False):
+        """
+        Constructor
+        :param chunk_size: int - bytes transferred per chunk (between progress/cancel checks), rounded up to
+            a multiple of BUFFER_ALIGNMENT
+        :param method: str - one of METHODS, auto picks the fastest available
+        :param atomic: bool - write to a temporary file and rename it over the destination
+        :param skip_identical: str - one of SKIP_MODES, don't copy over an identical destination
+        :param strategy: str - one of STRATEGIES
+        :param checksum: str - one of CHECKSUMS, hash the data while it is copied
+        :param verify: str - one of VERIFY_MODES, check the written data before it replaces the destination
+        :param sidecar: bool - write the checksum to a <file>.<algorithm> file next to the destination
+        :param resume_min_size: int - files of at least this many bytes are copied resumably, None never
+        :param retries: int - attempts to resume a resumable copy after a network/IO error
+        :param scheduler: IOScheduler - limits the transfers and bandwidth per destination volume
+        :param preallocate: bool - reserve the whole destination with posix_fallocate before copying, glibc
+                            emulates it by writing every block on filesystems without fallocate (ie: NFS)
+        :param drop_cache: bool - keep copied data out of the page cache with posix_fadvise
+        """
+        if method not in METHODS:
+            raise ValueError(f'Unknown copy method "{method}", expected one of: {", ".join(METHODS)}')
+
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown copy strategy "{strategy}", expected one of: {", ".join(STRATEGIES)}')
+
+        if skip_identical not in SKIP_MODES:
+            raise ValueError(f'Unknown skip mode "{skip_identical}", expected one of: {", ".join(SKIP_MODES)}')
+
+        if checksum not in CHECKSUMS:
+            raise ValueError(f'Unknown checksum "{checksum}", expected one of: {", ".join(CHECKSUMS)}')
+
+        if verify not in VERIFY_MODES:
+            raise ValueError(f'Unknown verify mode "{verify}", expected one of: {", ".join(VERIFY_MODES)}')
+
+        self.chunk_size = aligned_size(chunk_size)
+        self.method = method
+        self.atomic = atomic
+        self.skip_identical = skip_identical
+        self.strategy = strategy
+        self.checksum = checksum
+        self.verify = verify
+        self.sidecar = sidecar
+        self.resume_min_size = resume_min_size
+        self.retries = retries
+        self.scheduler = scheduler
+        self.preallocate = preallocate
+        self.drop_cache = drop_cache
+
+    @classmethod
+    def from_app(cls, app):
+        """
+        Create a copier configured from the copy_* settings of the app
+        :param app: Application
+        :return: FileCopier
+        """
+        return cls(chunk_size=app.get_setting("copy_chunk_size_mb") * 1024 * 1024,
+                   method=app.get_setting("copy_method"),
+                   skip_identical=app.get_setting("copy_skip_identical"),
+                   strategy=app.get_setting("copy_strategy"),
+                   checksum=app.get_setting("copy_checksum"),
+                   verify=app.get_setting("copy_verify"),
+                   sidecar=app.get_setting("copy_checksum_sidecar"),
+                   resume_min_size=app.get_setting("copy_resumable_min_size_mb") * 1024 * 1024 or None,
+                   retries=app.get_setting("copy_retries"),
+                   scheduler=app.io_scheduler,
+                   preallocate=app.get_setting("copy_preallocate"),
+                   drop_cache=app.get_setting("copy_drop_cache"))
+
+    def with_strategy(self, strategy):
+        """
+        Copier with the same settings and another strategy, copies already running keep theirs
+        :param strategy: str - see STRATEGIES
+        :return: FileCopier
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy "{strategy}", expected one of: {", ".join(STRATEGIES)}')
+
+        copier = copy.copy(self)
+        copier.strategy = strategy
+        return copier
+
+    def methods(self):
+        """
+        :return: list of str - transfer methods to try, in order
+        """
+        # Hashing while copying needs the data to go through user space
+        if self.method != METHOD_AUTO or self.checksum != CHECKSUM_OFF:
+            return [self.method if self.checksum == CHECKSUM_OFF else METHOD_READWRITE]
+
+        methods = []
+        if hasattr(os, 'copy_file_range'):
+            methods.append(METHOD_COPY_FILE_RANGE)
+        if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            methods.append(METHOD_SENDFILE)
+        methods.append(METHOD_READWRITE)
+
+        return methods
+
+    def copy(self, src, dst, progress_callback=None, cancel_event=None, priority=None):
+        """
+        Copy the content and modification time of src to dst.
+        With atomic enabled the data is written to a temporary file next to dst which then
+        replaces dst in a single rename, readers never see a missing or partial file.
+        :param src: str - source file path
+        :param dst: str - destination file path, its directory must exist
+        :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+        :param cancel_event: threading.Event - set it to cancel the copy
+        :param priority: int - scheduler priority class, defaults to the class of the file size
+        :return: CopyResult
+        """
+        src_stat = os.stat(src)
+        total = src_stat.st_size
+        start = time.monotonic()
+
+        if self.skip_identical != SKIP_OFF and files_identical(src, dst, self.skip_identical == SKIP_HASH):
+            log.info(f'Skipped copy, destination is identical: {src} >> {dst}')
+            if progress_callback:
+                progress_callback(total, total, time.monotonic() - start)
+            return CopyResult(src, dst, total, time.monotonic() - start, 'skipped', True)
+
+        strategy = self.resolve_strategy(src, dst)
+
+        # Renaming a hardlink over another name of the same inode does nothing, leaving the temporary link behind
+        if strategy == STRATEGY_HARDLINK and os.path.exists(dst) and os.path.samefile(src, dst):
+            log.info(f'Skipped copy, destination is already a hardlink of the source: {src} >> {dst}')
+            if progress_callback:
+                progress_callback(total, total, time.monotonic() - start)
+            return CopyResult(src, dst, total, time.monotonic() - start, 'skipped', True)
+
+        out_path = temp_path(dst) if self.atomic else dst
+
+        hasher = new_hasher(self.checksum) if self.checksum != CHECKSUM_OFF else None
+        digest = None
+
+        try:
+            method = strategy
+            copied = total
+
+            if strategy == STRATEGY_REFLINK and not self._reflink(src, out_path):
+                strategy = STRATEGY_COPY
+
+            elif strategy in (STRATEGY_HARDLINK, STRATEGY_SYMLINK) and os.path.lexists(out_path):
+                # Links can't be created over an existing file, only happens when not atomic
+                os.remove(out_path)
+
+            if strategy == STRATEGY_HARDLINK:
+                os.link(src, out_path)
+
+            elif strategy == STRATEGY_SYMLINK:
+                os.symlink(os.path.abspath(src), out_path)
+
+            if strategy == STRATEGY_COPY:
+                with self._schedule(dst, total, cancel_event, priority) as throttle:
+                    if self.resume_min_size is not None and total >= self.resume_min_size:
+                        out_path = resume_path(src, dst) if self.atomic or os.path.exists(dst) else dst
+                        copied, method, hasher = self._resumable_transfer(src, src_stat, out_path, start,
+                                                                          progress_callback, cancel_event,
+                                                                          f'{src} >> {dst}', hasher, throttle)
+
+                    else:
+                        with open(src, 'rb', buffering=0) as fsrc, open(out_path, 'wb', buffering=0) as fdst:
+                            copied, method = self._transfer(fsrc, fdst, total, start, progress_callback,
+                                                            cancel_event, f'{src} >> {dst}', hasher,
+                                                            throttle=throttle)
+
+            if hasher is not None:
+                # Links and clones don't stream the data, hash the source instead
+                digest = hasher.hexdigest() if strategy == STRATEGY_COPY else compute_digest(src, self.checksum)
+
+            if strategy in (STRATEGY_COPY, STRATEGY_REFLINK):
+                self._verify(src, out_path, total, digest)
+
+            # Keep the modification time so unchanged files can be skipped next time
+            if strategy in (STRATEGY_COPY, STRATEGY_REFLINK):
+                os.utime(out_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+            if self.atomic:
+                os.replace(out_path, dst)
+
+        except OSError:
+            # Keep the partial file of a resumable copy, the next attempt carries on from it
+            if not os.path.exists(out_path + '.journal'):
+                self._remove_partial(out_path)
+            raise
+
+        except BaseException:
+            self._remove_partial(out_path)
+            self._remove_partial(out_path + '.journal')
+            raise
+
+        elapsed = time.monotonic() - start
+        if progress_callback:
+            progress_callback(copied, total, elapsed)
+
+        rate, _ = transfer_rate(copied, total, elapsed)
+        log.info(f'Copied {format_size(copied)} in {elapsed:.2f}s ({format_size(rate)}/s, {method}, '
+                 f'{format_size(self.chunk_size)} chunks): {src} >> {dst}')
+
+        if digest:
+            algorithm = hasher_name(hasher)
+            log.info(f'Checksum {algorithm} {digest}: {dst}')
+            if self.sidecar:
+                write_sidecar(dst, digest, algorithm)
+
+        return CopyResult(src, dst, copied, elapsed, method, False, digest)
+
+    def copy_many(self, src, dsts, progress_callback=None, cancel_event=None, priority=None):
+        """
+        Copy one file to several destinations reading the source only once: each chunk is
+        read while the previous one is written to all destinations in parallel.
+        Destinations that get a link or a clone, or are already identical, go through copy().
+        :param src: str - source file path
+        :param dsts: list of str - destination file paths, their directories must exist
+        :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+        :param cancel_event: threading.Event - set it to cancel the copy
+        :param priority: int - scheduler priority class, defaults to the class of the file size
+        :return: list of CopyResult, in the order of dsts
+        """
+        dsts = list(OrderedDict.fromkeys(dsts))
+        results = {}
+        streamed = []
+
+        for dst in dsts:
+            if len(dsts) == 1 or self.resolve_strategy(src, dst) != STRATEGY_COPY or \
+                    (self.skip_identical != SKIP_OFF and files_identical(src, dst, self.skip_identical == SKIP_HASH)):
+                results[dst] = self.copy(src, dst, progress_callback, cancel_event, priority)
+            else:
+                streamed.append(dst)
+
+        if len(streamed) == 1:
+            results[streamed[0]] = self.copy(src, streamed[0], progress_callback, cancel_event, priority)
+
+        elif streamed:
+            results.update(self._fan_out(src, streamed, progress_callback, cancel_event, priority))
+
+        return [results[dst] for dst in dsts]
+
+    def _fan_out(self, src, dsts, progress_callback, cancel_event, priority):
+        """
+        Stream a file to several destinations, see copy_many
+        :return: dict - {destination: CopyResult}
+        """
+        src_stat = os.stat(src)
+        total = src_stat.st_size
+        start = time.monotonic()
+        description = f'{src} >> {len(dsts)} destinations'
+
+        out_paths = [temp_path(dst) if self.atomic else dst for dst in dsts]
+        hasher = new_hasher(self.checksum) if self.checksum != CHECKSUM_OFF else None
+        last_report = 0.0
+        copied = 0
+
+        # One transfer slot per destination volume, always taken in the same order
+        volumes = OrderedDict()
+        for dst in sorted(dsts, key=lambda d: volume_id(d) or 0):
+            volumes.setdefault(volume_id(dst), dst)
+
+        try:
+            with contextlib.ExitStack() as stack:
+                throttles = [stack.enter_context(self._schedule(dst, total, cancel_event, priority))
+                             for dst in volumes.values()]
+                throttles = [t for t in throttles if t is not None]
+
+                fsrc = stack.enter_context(open(src, 'rb', buffering=0))
+                fdsts = [stack.enter_context(open(path, 'wb', buffering=0)) for path in out_paths]
+                pool = stack.enter_context(ThreadPoolExecutor(max_workers=len(fdsts)))
+
+                if self.preallocate:
+                    for fdst in fdsts:
+                        preallocate(fdst.fileno(), total)
+                if self.drop_cache:
+                    advise(fsrc.fileno(), 0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+                buffers = [aligned_buffer(self.chunk_size), aligned_buffer(self.chunk_size)]
+                index = 0
+                writes = []
+
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise CopyCancelled(f'Copy cancelled: {description}')
+
+                    # Read the next chunk while the previous one is being written
+                    buf = buffers[index]
+                    index ^= 1
+                    read = fsrc.readinto(buf)
+
+                    for write in writes:
+                        write.result()
+
+                    if not read:
+                        if self.preallocate and copied < total:
+                            for fdst in fdsts:
+                                fdst.truncate(copied)
+                        break
+
+                    data = memoryview(buf)[:read]
+                    if hasher is not None:
+                        hasher.update(data)
+                    writes = [pool.submit(self._write_all, fdst, data) for fdst in fdsts]
+
+                    copied += read
+                    for throttle in throttles:
+                        throttle(read)
+
+                    now = time.monotonic()
+                    if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                        last_report = now
+                        progress_callback(copied, total, now - start)
+
+            digest = hasher.hexdigest() if hasher is not None else None
+
+            for path in out_paths:
+                self._verify(src, path, total, digest)
+                os.utime(path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+            if self.atomic:
+                for path, dst in zip(out_paths, dsts):
+                    os.replace(path, dst)
+
+        except BaseException:
+            for path in out_paths:
+                self._remove_partial(path)
+            raise
+
+        elapsed = time.monotonic() - start
+        if progress_callback:
+            progress_callback(copied, total, elapsed)
+
+        rate, _ = transfer_rate(copied, total, elapsed)
+        log.info(f'Copied {format_size(copied)} to {len(dsts)} destinations in {elapsed:.2f}s '
+                 f'({format_size(rate)}/s read once): {src} >> {", ".join(dsts)}')
+
+        if digest:
+            algorithm = hasher_name(hasher)
+            log.info(f'Checksum {algorithm} {digest}: {src}')
+            if self.sidecar:
+                for dst in dsts:
+                    write_sidecar(dst, digest, algorithm)
+
+        return dict((dst, CopyResult(src, dst, copied, elapsed, METHOD_FAN_OUT, False, digest)) for dst in dsts)
+
+    def _verify(self, src, path, size, digest):
+        """
+        Check the written data against the source, raising CopyVerificationError on mismatch
+        :param src: str - source file path
+        :param path: str - written file path
+        :param size: int - source size
+        :param digest: str - checksum streamed during the copy, if any
+        :return: None
+        """
+        if self.verify == VERIFY_OFF:
+            return
+
+        written = os.path.getsize(path)
+        if written != size:
+            raise CopyVerificationError(f'Copied {written} bytes instead of {size}: {src}')
+
+        if self.verify == VERIFY_SAMPLED:
+            ok = sampled_digest(src, size) == sampled_digest(path, size)
+
+        else:
+            checksum = self.checksum if self.checksum != CHECKSUM_OFF else CHECKSUM_FAST
+            ok = (digest or compute_digest(src, checksum)) == compute_digest(path, checksum)
+
+        if not ok:
+            raise CopyVerificationError(f'Copied data does not match the source ({self.verify} verification): {src}')
+
+    def resolve_strategy(self, src, dst):
+        """
+        Pick how a file gets to its destination. Links need the same volume, when they
+        can't be used the file is copied.
+        :param src: str - source file path
+        :param dst: str - destination file path
+        :return: str - one of STRATEGIES, never auto
+        """
+        strategy = self.strategy
+        if strategy in (STRATEGY_COPY, STRATEGY_SYMLINK):
+            return strategy
+
+        if not same_device(src, dst):
+            if strategy == STRATEGY_HARDLINK:
+                log.warning(f'Unable to hardlink across volumes, copying instead: {src} >> {dst}')
+            return STRATEGY_COPY
+
+        if strategy == STRATEGY_AUTO:
+            return STRATEGY_REFLINK if sys.platform.startswith('linux') else STRATEGY_COPY
+
+        return strategy
+
+    @staticmethod
+    def _reflink(src, dst):
+        """
+        Clone the data of src into dst without copying it (copy on write)
+        :param src: str - source file path
+        :param dst: str - new file path
+        :return: bool - False if the filesystem can't clone, dst doesn't exist then
+        """
+        if fcntl is None:
+            return False
+
+        try:
+            with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+
+        except OSError as err:
+            log.debug(f'Reflink not supported for {src} >> {dst} ({err}), copying instead')
+            if os.path.exists(dst):
+                os.remove(dst)
+            return False
+
+    def _schedule(self, dst, size, cancel_event, priority=None):
+        """
+        Transfer slot of the scheduler, if any
+        :return: context manager yielding the throttle callable or None
+        """
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+
+        return self.scheduler.transfer(dst, size, cancel_event, priority)
+
+    def _resumable_transfer(self, src, src_stat, out_path, start, progress_callback, cancel_event, description,
+                            hasher=None, throttle=None):
+        """
+        Copy into a partial file journaled next to it, carrying on from the data already
+        on disk (from this or a previous attempt) after network/IO errors
+        :param src: str - source file path
+        :param src_stat: os.stat_result - stat of the source
+        :param out_path: str - partial file path
+        :param start: float - time.monotonic() of the start of the copy
+        :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+        :param cancel_event: threading.Event - set it to cancel the copy
+        :param description: str - used in log and error messages
+        :param hasher: hasher updated with the data, replaced by a new one on every attempt
+        :param throttle: callable - called with the bytes sent by each chunk
+        :return: tuple - (bytes copied, transfer method used, hasher of the whole file)
+        """
+        journal = ResumeJournal(out_path + '.journal', src, src_stat)
+        attempt = 0
+
+        while True:
+            offset = journal.resume_offset(out_path)
+            if hasher is not None and attempt:
+                hasher = new_hasher(self.checksum)
+
+            try:
+                with open(src, 'rb', buffering=0) as fsrc, open(out_path, 'r+b' if offset else 'wb',
+                                                                 buffering=0) as fdst:
+                    if offset:
+                        log.info(f'Resuming copy at {format_size(offset)} of {format_size(src_stat.st_size)}: '
+                                 f'{description}')
+                        fdst.truncate(offset)
+                        if hasher is not None:
+                            self._hash_range(fdst, offset, hasher)
+                    else:
+                        journal.start()
+
+                    copied, method = self._transfer(fsrc, fdst, src_stat.st_size, start, progress_callback,
+                                                    cancel_event, description, hasher, offset, journal.checkpoint,
+                                                    throttle)
+
+                journal.remove()
+                return copied, method, hasher
+
+            except OSError as err:
+                attempt += 1
+                if err.errno not in RETRY_ERRNOS or attempt > self.retries:
+                    raise
+
+                backoff = min(2 ** attempt, RESUME_MAX_BACKOFF)
+                log.warning(f'Copy interrupted ({err}), resuming in {backoff}s, attempt {attempt} of '
+                            f'{self.retries}: {description}')
+                time.sleep(backoff)
+
+    @staticmethod
+    def _hash_range(handle, size, hasher):
+        """
+        Feed the first bytes of an open file to a hasher
+        """
+        buf = bytearray(HASH_CHUNK_SIZE)
+        handle.seek(0)
+        remaining = size
+        while remaining:
+            read = handle.readinto(memoryview(buf)[:min(remaining, HASH_CHUNK_SIZE)])
+            if not read:
+                break
+            hasher.update(memoryview(buf)[:read])
+            remaining -= read
+
+    def _transfer(self, fsrc, fdst, total, start, progress_callback, cancel_event, description, hasher=None,
+                  offset=0, checkpoint=None, throttle=None):
+        """
+        Move the data between two open files, chunk by chunk
+        :param fsrc: FileIO - unbuffered source file
+        :param fdst: FileIO - unbuffered destination file
+        :param total: int - bytes to copy
+        :param start: float - time.monotonic() of the start of the copy
+        :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+        :param cancel_event: threading.Event - set it to cancel the copy
+        :param description: str - used in log and error messages
+        :param hasher: hasher updated with the data, only used by the read/write method
+        :param offset: int - bytes already copied, the copy carries on from there
+        :param checkpoint: callable - called with (fdst, bytes copied) every RESUME_CHECKPOINT bytes
+        :param throttle: callable - called with the bytes sent by each chunk, sleeps to limit the bandwidth
+        :return: tuple - (bytes copied, transfer method used)
+        """
+        last_report = 0.0
+        copied = offset
+        last_checkpoint = offset
+        dropped = offset
+
+        methods = self.methods()
+        method = methods.pop(0)
+        buf = None
+
+        # Few large extents instead of one per chunk, the size is fixed up at the end
+        preallocated = self.preallocate and total > offset and preallocate(fdst.fileno(), total)
+
+        if self.drop_cache:
+            advise(fsrc.fileno(), offset, 0, 'POSIX_FADV_SEQUENTIAL')
+
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise CopyCancelled(f'Copy cancelled: {description}')
+
+            try:
+                if method == METHOD_COPY_FILE_RANGE:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), self.chunk_size, copied, copied)
+
+                elif method == METHOD_SENDFILE:
+                    # sendfile writes at the current position of the destination
+                    fdst.seek(copied)
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, self.chunk_size)
+
+                else:
+                    if buf is None:
+                        buf = aligned_buffer(self.chunk_size)
+                    fsrc.seek(copied)
+                    fdst.seek(copied)
+                    sent = fsrc.readinto(buf)
+                    self._write_all(fdst, memoryview(buf)[:sent])
+                    if hasher is not None:
+                        hasher.update(memoryview(buf)[:sent])
+
+            except OSError as err:
+                if err.errno not in FALLBACK_ERRNOS or not methods:
+                    raise
+
+                log.debug(f'{method} not supported for {description} ({err}), falling back')
+                method = methods.pop(0)
+                continue
+
+            if not sent:
+                # Some filesystems report 0 bytes from the in kernel methods before the end of file
+                if copied < total and method != METHOD_READWRITE and methods:
+                    log.debug(f'{method} stopped at {copied} of {total} bytes, falling back')
+                    method = methods.pop(0)
+                    continue
+                break
+
+            copied += sent
+
+            if throttle is not None:
+                throttle(sent)
+
+            if self.drop_cache:
+                advise(fsrc.fileno(), copied - sent, sent, 'POSIX_FADV_DONTNEED')
+                # Dirty pages can't be dropped, DONTNEED starts their write back and the
+                # range is dropped once the copy is far enough ahead
+                if copied - dropped >= 2 * DROP_CACHE_WINDOW:
+                    advise(fdst.fileno(), dropped, copied - DROP_CACHE_WINDOW - dropped, 'POSIX_FADV_DONTNEED')
+                    dropped = copied - DROP_CACHE_WINDOW
+
+            if checkpoint is not None and copied - last_checkpoint >= RESUME_CHECKPOINT:
+                last_checkpoint = copied
+                checkpoint(fdst, copied)
+
+            now = time.monotonic()
+            if progress_callback and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                progress_callback(copied, total, now - start)
+
+        if preallocated and copied < total:
+            # The source got shorter during the copy
+            fdst.truncate(copied)
+
+        if self.drop_cache:
+            advise(fdst.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+
+        return copied, method
+
+    @staticmethod
+    def _write_all(fdst, data):
+        while data:
+            written = fdst.write(data)
+            data = data[written:]
+
+    @staticmethod
+    def _remove_partial(path):
+        try:
+            if os.path.lexists(path):
+                os.remove(path)
+                log.info(f'Removed partial copy: {path}')
+        except OSError as err:
+            log.error(f'Failed to remove partial copy: {path}\n{err}')
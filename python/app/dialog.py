@@ -11,8 +11,9 @@
 import sys
 import os
 import re
-import shutil
 import subprocess
+import threading
+import time
 from pprint import pprint, pformat
 
 import sgtk
@@ -20,6 +21,19 @@ import sgtk
 # # the code will be compatible with both PySide and PyQt.
 from sgtk.platform.qt import QtCore, QtGui
 from .ui.dialog import Ui_Form
+from .template_index import get_template_index
+from . import resolver
+from .registration import ContextRegistrar
+from .ui.copyprogresswidget import CopyProgressWidget
+from .ui.ingestqueuewidget import IngestQueueWidget
+from .ui.workareasdialog import WorkAreasDialog
+from . import copy_engine
+from . import directories
+from . import ingest
+from . import sequences
+from . import tree_copy
+from . import versions
+from . import work_areas
 
 from tank import TankError
 
@@ -54,6 +68,18 @@ class AppDialog(QtGui.QWidget):
     Main application dialog window
     """
 
+    # Emitted from the background registration task, delivered on the GUI thread
+    registration_progress = QtCore.Signal(str)
+
+    # Emitted from the background copy task with (bytes copied, total bytes, elapsed seconds)
+    copy_progress = QtCore.Signal(object, object, float)
+
+    # Emitted from the ingest queue workers with the IngestItem whose status or progress changed
+    ingest_item_changed = QtCore.Signal(object)
+
+    # Emitted from the background work areas task with (tasks done, tasks total, message)
+    work_areas_progress = QtCore.Signal(int, int, str)
+
     def __init__(self):
         """
         Constructor
@@ -65,6 +91,25 @@ class AppDialog(QtGui.QWidget):
         self.template = None
         self.fields = None
         self.ctx = None
+        self.file_path_pattern = None
+
+        self._registration_task_id = None
+        self._registration_message = ''
+        self._registration_start = 0
+
+        self._copier = None
+        self._copy_strategy = None
+        self._copy_task_id = None
+        self._copy_cancel_event = None
+        self._copy_sequence = None
+
+        self._work_areas_task_id = None
+        self._work_areas_cancel_event = None
+
+        self._path_match_task_id = None
+        self._path_match_path = None
+
+        self._ingest_plan_task_id = None
 
         # Logging
         self.log = sgtk.platform.get_logger(__name__)
@@ -77,6 +122,10 @@ class AppDialog(QtGui.QWidget):
         # it is often handy to keep a reference to this. You can get it via the following method:
         self._app = sgtk.platform.current_bundle()
 
+        # Copies of the dialog, configured from the copy_* settings
+        self._copier = copy_engine.FileCopier.from_app(self._app)
+        self._copy_strategy = self._copier.strategy
+
         # Get Application definitions
         self.applications = self._app.get_setting("tk-engines")
 
@@ -126,6 +175,17 @@ class AppDialog(QtGui.QWidget):
 
         self._overlay_widget = overlay_widget.ShotgunOverlayWidget(self)
 
+        # Context registration runs on the task manager, the overlay shows its progress
+        self._registrar = ContextRegistrar(self._app.sgtk, self._task_manager,
+                                           context_cache=self._app.context_cache)
+        self._task_manager.task_completed.connect(self._on_registration_completed)
+        self._task_manager.task_failed.connect(self._on_registration_failed)
+        self.registration_progress.connect(self._on_registration_progress)
+
+        self._registration_timer = QtCore.QTimer(self)
+        self._registration_timer.setInterval(500)
+        self._registration_timer.timeout.connect(self._update_registration_overlay)
+
         # Specify what entries should show up in the list of links when using
         # the auto completer. In this case, we only show entity types that are
         # allowed for the PublishedFile.entity field. You can provide an
@@ -152,6 +212,20 @@ class AppDialog(QtGui.QWidget):
 
         self.ui.contentWidgetVerticalLayout.addWidget(self._context_widget)
 
+        # Bulk creation of the work areas of many tasks, runs on the task manager
+        self._work_areas_button = QtGui.QPushButton('Create Work Areas...', self)
+        self._work_areas_button.setToolTip('Create the folders of every task assigned to you, or of every task of '
+                                           'the current sequence, for the selected applications')
+        self._work_areas_button.released.connect(self.create_work_areas)
+        self.ui.contentWidgetVerticalLayout.addWidget(self._work_areas_button)
+
+        self._work_areas_progress_widget = CopyProgressWidget(self)
+        self._work_areas_progress_widget.cancel_button.setToolTip('Stop creating work areas, the ones created '
+                                                                  'are kept')
+        self._work_areas_progress_widget.cancel_requested.connect(self.cancel_work_areas)
+        self.ui.contentWidgetVerticalLayout.addWidget(self._work_areas_progress_widget)
+        self.work_areas_progress.connect(self._on_work_areas_progress)
+
         # you can set a context using the `set_context()` method. Here we set it
         # to the current bundle's context
         self._context_widget.set_context(sgtk.platform.current_bundle().context)
@@ -183,6 +257,68 @@ class AppDialog(QtGui.QWidget):
         self.ui.copyFilePathOpenButton.released.connect(self.browse_file)
         self.ui.copyFileToFileButton.released.connect(self.copy_file_to_file_path)
 
+        # Copy strategy selector, links are only used on the same volume, see FileCopier.resolve_strategy
+        self._copy_strategy_combo = QtGui.QComboBox(self)
+        self._copy_strategy_combo.setToolTip('How the file gets to the file path:<br>'
+                                             '<b>auto</b> - reflink on the same volume if supported, copy otherwise<br>'
+                                             '<b>reflink</b> - copy on write clone, copy if not supported<br>'
+                                             '<b>hardlink</b> - same file in both places (same volume only)<br>'
+                                             '<b>symlink</b> - link pointing to the source file<br>'
+                                             '<b>copy</b> - full copy of the data')
+        for strategy in copy_engine.STRATEGIES:
+            self._copy_strategy_combo.addItem(strategy.title(), strategy)
+        self._copy_strategy_combo.setCurrentIndex(copy_engine.STRATEGIES.index(self._copier.strategy))
+        self._copy_strategy_combo.currentIndexChanged.connect(self._on_copy_strategy_changed)
+        self.ui.horizontalLayout.insertWidget(self.ui.horizontalLayout.indexOf(self.ui.copyFileToFileButton),
+                                              self._copy_strategy_combo)
+
+        # Other templates the file is copied to as well, the source is read once for all of them
+        self._copy_targets_menu = QtGui.QMenu(self)
+        self._copy_targets_button = QtGui.QToolButton(self)
+        self._copy_targets_button.setText('Also Copy To')
+        self._copy_targets_button.setToolTip('Copy the file to other templates of the application at the same time, '
+                                             'reading it only once')
+        self._copy_targets_button.setPopupMode(QtGui.QToolButton.InstantPopup)
+        self._copy_targets_button.setMenu(self._copy_targets_menu)
+        self.ui.horizontalLayout.insertWidget(self.ui.horizontalLayout.indexOf(self.ui.copyFileToFileButton),
+                                              self._copy_targets_button)
+
+        # Copies run on the task manager, showing their progress below the copy widgets
+        self._copy_progress_widget = CopyProgressWidget(self)
+        self.ui.verticalLayout.addWidget(self._copy_progress_widget)
+        self._copy_progress_widget.cancel_requested.connect(self.cancel_copy)
+        self.copy_progress.connect(self._on_copy_progress)
+        self._task_manager.task_completed.connect(self._on_copy_completed)
+        self._task_manager.task_failed.connect(self._on_copy_failed)
+        self._task_manager.task_completed.connect(self._on_work_areas_completed)
+        self._task_manager.task_failed.connect(self._on_work_areas_failed)
+
+        # Dropping several files or folders queues them all, resolved against the current template
+        self._ingest_queue = ingest.IngestQueue(self._copier,
+                                                self._app.get_setting("ingest_workers"),
+                                                self._app.get_setting("ingest_volume_concurrency"),
+                                                self.ingest_item_changed.emit)
+        self._ingest_widget = IngestQueueWidget(self)
+        self.ui.verticalLayout.addWidget(self._ingest_widget)
+        self._ingest_widget.cancel_requested.connect(self._ingest_queue.cancel)
+        self._ingest_widget.clear_requested.connect(self.clear_finished_ingests)
+        self.ingest_item_changed.connect(self._on_ingest_item_changed)
+        self.ui.copyFileLineEdit.paths_dropped.connect(self.ingest_files)
+        self._task_manager.task_completed.connect(self._on_ingest_plan_completed)
+        self._task_manager.task_failed.connect(self._on_ingest_plan_failed)
+
+        # A single dropped file is reverse resolved, showing the template, context and tokens it was made with
+        self._path_resolver = resolver.PathResolver(self._app.sgtk, self.custom_entity_name_remap)
+        self._path_match_label = QtGui.QLabel(self)
+        self._path_match_label.setWordWrap(True)
+        self._path_match_label.hide()
+        self.ui.verticalLayout.insertWidget(self.ui.verticalLayout.indexOf(self._copy_progress_widget),
+                                            self._path_match_label)
+        self.ui.copyFileLineEdit.path_dropped.connect(self.identify_dropped_path)
+        self.ui.copyFileLineEdit.textChanged.connect(self._on_copy_source_changed)
+        self._task_manager.task_completed.connect(self._on_path_match_completed)
+        self._task_manager.task_failed.connect(self._on_path_match_failed)
+
         self.update_applications()
 
     def update_applications(self):
@@ -196,8 +332,8 @@ class AppDialog(QtGui.QWidget):
         for appKey in app_keys:
             self.ui.appComboBox.addItem(QtGui.QIcon(':/res/sg_logo.png'), appKey, self.applications[appKey])
 
+        # The template list is populated once the context has been registered, see _on_registration_completed
         self.ui.appComboBox.currentIndexChanged.connect(self.update_tk_context)
-        self.ui.appComboBox.currentIndexChanged.connect(self.update_tk_templates)
 
     def update_tk_templates(self):
         if not self.context:
@@ -210,38 +346,26 @@ class AppDialog(QtGui.QWidget):
             self.log.error('Unable to get TK instance, unable to update TK templates.')
             return
 
-        templates = tk.templates
-
         # Support non-engine template definitions. If None, then use the engine key name instead. ie: Data > data > take_data
-        app_name = str(self.ui.appComboBox.itemData(self.ui.appComboBox.currentIndex()))
-        if app_name:
-            app_name = app_name.lower().replace(' ', '').replace('tk-', '')
-        else:
-            app_name = self.ui.appComboBox.currentText().lower()
-
-        entity_type = self.context.entity['type']
+        app_name = resolver.normalize_engine_name(self.ui.appComboBox.itemData(self.ui.appComboBox.currentIndex()),
+                                                  self.ui.appComboBox.currentText())
 
         # Remap entity name
-        entity_type = self.custom_entity_name_remap.get(entity_type, entity_type).lower()
-
-        regex = f'{entity_type}_{app_name}'
+        entity_type = resolver.remap_entity_type(self.context.entity['type'], self.custom_entity_name_remap)
 
-        active_templates = {}
+        template_index = get_template_index(tk)
+        active_templates = template_index.lookup(entity_type, app_name)
+        self.log.debug(f'Template index stats: {template_index.stats()}')
 
-        for k, v in templates.items():
-            if re.search(regex, k):
-                active_templates[k] = v
+        self.reset_tk_templates()
 
-        self.ui.tkTemplateComboBox.clear()
-
-        active_keys = active_templates.keys()
-        sorted(active_keys)
-
-        self.ui.tkTemplateComboBox.addItem(QtGui.QIcon(':/res/block.png'), 'Select Template')
-
-        for key in active_keys:
+        for key, template in active_templates:
             key_title = key.replace(entity_type, '').replace('_', ' ').title()
-            self.ui.tkTemplateComboBox.addItem(QtGui.QIcon(':/res/sg_logo.png'), key_title, active_templates[key])
+            self.ui.tkTemplateComboBox.addItem(QtGui.QIcon(':/res/sg_logo.png'), key_title, template)
+
+            action = self._copy_targets_menu.addAction(key_title)
+            action.setCheckable(True)
+            action.setData(template)
 
         # Default to "work" template if available
         index = self.ui.tkTemplateComboBox.findText('Work', QtCore.Qt.MatchContains)
@@ -281,47 +405,82 @@ class AppDialog(QtGui.QWidget):
 
     def update_tk_context(self):
         """
-        Register the selected context with Toolkit
+        Register the selected context with Toolkit in the background.
+        The template list is populated when the registration has finished.
         """
+        self.ctx = None
+        self._registration_task_id = None
+        self.reset_tk_templates()
 
-        if self.ui.appComboBox.currentIndex() == 0:
+        if self.ui.appComboBox.currentIndex() < 1 or not self.context:
+            self._registrar.cancel_obsolete()
+            self._stop_registration_overlay()
             return
 
         tkengine = self.ui.appComboBox.itemData(self.ui.appComboBox.currentIndex())
 
         # Try to get as deep into a valid context
-        if self.context.task:
-            typ = self.context.task['type']
-            idd = self.context.task['id']
+        typ, idd = resolver.context_entity(self.context)
+
+        # Registered moments ago, no need to go through the task manager
+        ctx = self._app.context_cache.registered_context(typ, idd)
+        if ctx:
+            self._registrar.cancel_obsolete()
+            self._stop_registration_overlay()
+            self.ctx = ctx
+            self.update_tk_templates()
+            return
 
-        elif self.context.step:
-            typ = self.context.step['type']
-            idd = self.context.step['id']
+        self._registration_start = time.time()
+        self._registration_message = 'Registering context with Toolkit, please wait...'
+        self._update_registration_overlay()
+        self._registration_timer.start()
 
-        elif self.context.source_entity:
-            typ = self.context.source_entity['type']
-            idd = self.context.source_entity['id']
+        # Joins a registration already in flight for the same entity/engine, and drops the
+        # queued registrations of previous selections
+        self._registration_task_id = self._registrar.request(typ, idd, tkengine, self.registration_progress.emit)
+        self._registrar.cancel_obsolete(self._registration_task_id)
 
-        else:
-            raise TankError('Unable to determine Context Entity and ID, check current Context.')
+    def _on_registration_progress(self, message):
+        self._registration_message = message
+        self._update_registration_overlay()
 
-        # Check if Context is already registered in Toolkit, if not, then register it
-        paths = self._app.sgtk.paths_from_entity(typ, idd)
+    def _update_registration_overlay(self):
+        elapsed = time.time() - self._registration_start
+        self._overlay_widget.show_message(f'<h2 style="color:#4383a8">{self._registration_message}</h2>'
+                                          f'<p>{elapsed:.0f}s elapsed</p>')
 
-        if not paths:
-            try:
-                self._overlay_widget.show_message('<h2 style="color:#4383a8">Registering context with Toolkit, please wait...</h2>')
-                QtGui.QApplication.instance().processEvents()
-                self.log.info('Creating folder structure on disk')
-                self._app.sgtk.create_filesystem_structure(typ, idd, engine=tkengine)
+    def _stop_registration_overlay(self):
+        self._registration_timer.stop()
+        self._overlay_widget.hide()
 
-            except:
-                pass
+    def _on_registration_completed(self, uid, group, result):
+        if self._registrar.finished(uid) is None or uid != self._registration_task_id:
+            return
 
-            finally:
-                self._overlay_widget.hide()
+        self._registration_task_id = None
+        self._stop_registration_overlay()
+
+        self.ctx = result
+        self.update_tk_templates()
+
+    def _on_registration_failed(self, uid, group, msg, stack_trace):
+        if self._registrar.finished(uid) is None or uid != self._registration_task_id:
+            return
 
-        self.ctx = self._app.sgtk.context_from_entity(typ, idd)
+        self._registration_task_id = None
+        self._stop_registration_overlay()
+
+        self.log.error(f'Failed to register context with Toolkit: {msg}\n{stack_trace}')
+        self._overlay_widget.show_error_message(f'Failed to register context with Toolkit: {msg}')
+
+    def reset_tk_templates(self):
+        """
+        Remove all templates from the template combobox
+        """
+        self.ui.tkTemplateComboBox.clear()
+        self.ui.tkTemplateComboBox.addItem(QtGui.QIcon(':/res/block.png'), 'Select Template')
+        self._copy_targets_menu.clear()
 
     def update_template_output_paths(self):
         if self.ui.tkTemplateComboBox.currentIndex() == 0:
@@ -329,7 +488,7 @@ class AppDialog(QtGui.QWidget):
 
         self.template = self.ui.tkTemplateComboBox.itemData(self.ui.tkTemplateComboBox.currentIndex())
 
-        if not self.template:
+        if not self.template or not self.ctx:
             return
 
         # Update template definition label
@@ -370,6 +529,10 @@ class AppDialog(QtGui.QWidget):
 
                 default_value = tk_key.default
 
+                # Pre-fill the next free version so existing work files aren't overwritten
+                if key == versions.VERSION_KEY and isinstance(tk_key, sgtk.templatekey.IntegerKey):
+                    default_value = versions.next_version(template, self.fields) or default_value
+
                 # Combobox for TK Template Keys that have choices
                 choices = tk_key.choices
                 if choices:
@@ -495,12 +658,11 @@ class AppDialog(QtGui.QWidget):
 
         filepath = self.template.apply_fields(self.fields)
 
-        # replace any frame padding with value
-        try:
-            filepath = filepath % 1
+        # keep the frame padding for image sequence copies ie: /path/file.%04d.exr
+        self.file_path_pattern = resolver.sequence_pattern(self.template, self.fields)
 
-        except:
-            pass
+        # replace any frame padding with value
+        filepath = resolver.apply_frame(filepath)
 
         if self.is_path_file(filepath):
             self.ui.fileNameLineEdit.setText(os.path.basename(filepath))
@@ -549,6 +711,11 @@ class AppDialog(QtGui.QWidget):
             subprocess.Popen(['xdg-open', path])
 
     def browse_file(self):
+        # Directory templates take a whole folder
+        if self.ui.filePathLineEdit.text() and not self.is_path_file(self.ui.filePathLineEdit.text()):
+            self.ui.copyFileLineEdit.setText(QtGui.QFileDialog.getExistingDirectory(self))
+            return
+
         file_name = QtGui.QFileDialog.getOpenFileName()
         self.ui.copyFileLineEdit.setText(file_name[0])
 
@@ -567,8 +734,7 @@ class AppDialog(QtGui.QWidget):
                     dirpath = path
 
                 # Create a directory structure first
-                if not os.path.exists(dirpath):
-                    os.makedirs(dirpath)
+                if directories.create_directories([dirpath]):
                     self.log.info(f'Created directories: {dirpath}')
 
                 if is_file:
@@ -592,11 +758,7 @@ class AppDialog(QtGui.QWidget):
         :param path: str - directory/file path
         :return: bool
         """
-        tmp = os.path.splitext(path)
-        if len(tmp) > 1 and tmp[1]:
-            return True
-
-        return False
+        return resolver.is_path_file(path)
 
     def copy_file_to_file_path(self):
         src_path = self.ui.copyFileLineEdit.text()
@@ -606,43 +768,487 @@ class AppDialog(QtGui.QWidget):
             self.log.warn('File doesnt not exist on disk, unable to copy: %s' % src_path)
             return
 
+        if os.path.isdir(src_path):
+            self.copy_tree_to_directory_path(src_path, dst_path)
+            return
+
+        # A frame dropped on a sequence template copies the whole image sequence
+        if self.file_path_pattern and self.copy_sequence_to_file_path(src_path, self.file_path_pattern):
+            return
+
+        dst_paths = [dst_path] + [p for p in self.extra_copy_destinations() if p != dst_path]
+
         # Check if the file exists
-        if os.path.exists(dst_path):
-            reply = QtGui.QMessageBox.question(self, 'File Exists',
-                                               'The file already exists, do you want to overwrite it?',
+        existing = [p for p in dst_paths if os.path.exists(p)]
+        if existing:
+            message = 'The file already exists, do you want to overwrite it?'
+            if len(dst_paths) > 1:
+                message = f'<h3>Some files already exist, do you want to overwrite them?</h3>{"<br>".join(existing)}'
+
+            reply = QtGui.QMessageBox.question(self, 'File Exists', message,
                                                QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
 
-            if reply == QtGui.QMessageBox.Yes:
-                try:
-                    os.remove(dst_path)
-                    self.log.info(f'Removed existing file: {dst_path}')
-                except Exception as err:
-                    self.log.error(f'Failed to remove existing file: {dst_path}')
-                    self.log.error(str(err))
-            else:
+            # The copy replaces the existing file in a single rename once complete,
+            # or is skipped if the existing file is identical
+            if reply != QtGui.QMessageBox.Yes:
                 return
 
-        # Copy file
-        try:
-            self.log.info(f'Copying: {src_path} >> {dst_path}')
+        # Copy file in the background, progress is reported through copy_progress
+        self.log.info(f'Copying: {src_path} >> {", ".join(dst_paths)}')
 
-            dirname = os.path.dirname(dst_path)
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
+        self._copy_cancel_event = threading.Event()
+        self._copy_task_id = self._task_manager.add_task(self._copy_file_task,
+                                                         task_args=[src_path, dst_paths, self._task_copier(),
+                                                                    self._copy_cancel_event])
 
-            shutil.copyfile(src_path, dst_path)
+        self.ui.copyFileToFileButton.setEnabled(False)
+        self._copy_progress_widget.start(f'Copying {os.path.basename(src_path)}...')
 
-            QtGui.QMessageBox.information(self, 'Success!',
-                                          '<h3>The file was copied successfully</h3>',
-                                          QtGui.QMessageBox.Ok)
+    def copy_sequence_to_file_path(self, src_path, dst_pattern):
+        """
+        Offer to copy the image sequence a file belongs to, every frame to the template path
+        :param src_path: str - any frame of the sequence
+        :param dst_pattern: str - template path with frame padding ie: /path/file.%04d.exr
+        :return: bool - True if handled (copy started or cancelled), False to copy the single file
+        """
+        sequence = sequences.find_sequence(src_path)
+        if not sequence:
+            return False
+
+        reply = QtGui.QMessageBox.question(self, 'Image Sequence',
+                                           f'<h3>Copy the whole image sequence?</h3>'
+                                           f'<br>{sequence.pattern}<br>Frames {sequence.frame_range}</br>',
+                                           QtGui.QMessageBox.Yes | QtGui.QMessageBox.No | QtGui.QMessageBox.Cancel)
+
+        if reply == QtGui.QMessageBox.Cancel:
+            return True
+
+        if reply != QtGui.QMessageBox.Yes:
+            return False
+
+        # One directory listing instead of a stat per frame
+        dst_dir = os.path.dirname(dst_pattern)
+        existing = set(os.listdir(dst_dir)) if os.path.isdir(dst_dir) else set()
+        if any(os.path.basename(dst_pattern % frame) in existing for frame in sequence.frames):
+            reply = QtGui.QMessageBox.question(self, 'Files Exist',
+                                               'Some frames already exist, do you want to overwrite them?',
+                                               QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
+            if reply != QtGui.QMessageBox.Yes:
+                return True
+
+        self.log.info(f'Copying sequence: {sequence.pattern} {sequence.frame_range} >> {dst_pattern}')
+
+        self._copy_cancel_event = threading.Event()
+        self._copy_sequence = sequence
+        self._copy_task_id = self._task_manager.add_task(sequences.copy_sequence,
+                                                         task_args=[sequence, dst_pattern, self._task_copier(),
+                                                                    self._app.get_setting("copy_sequence_workers"),
+                                                                    self.copy_progress.emit,
+                                                                    self._copy_cancel_event])
+
+        self.ui.copyFileToFileButton.setEnabled(False)
+        self._copy_progress_widget.start(f'Copying {len(sequence)} frames...')
+        return True
+
+    def extra_copy_destinations(self):
+        """
+        Resolve the templates checked in the "Also Copy To" menu with the current context and tokens
+        :return: list of str - file paths
+        """
+        paths = []
+
+        for action in self._copy_targets_menu.actions():
+            template = action.data()
+            if not action.isChecked() or template is self.template:
+                continue
+
+            fields = self.ctx.as_template_fields(template)
+            fields.update((k, v) for k, v in self.fields.items() if k in template.keys)
+
+            missing_keys = template.missing_keys(fields)
+            if missing_keys:
+                self.log.warning(f'Not copying to {action.text()}, missing tokens: {", ".join(missing_keys)}')
+                continue
+
+            path = resolver.apply_frame(template.apply_fields(fields))
+            if not self.is_path_file(path):
+                self.log.warning(f'Not copying to {action.text()}, the template is a directory: {path}')
+                continue
+
+            paths.append(path)
+
+        return paths
+
+    def copy_tree_to_directory_path(self, src_path, dst_path):
+        """
+        Copy a folder and everything in it into a directory template ie: render folders
+        :param src_path: str - source directory
+        :param dst_path: str - directory template path
+        :return: None
+        """
+        if self.is_path_file(dst_path):
+            QtGui.QMessageBox.warning(self, 'File Template',
+                                      'Folders can only be copied to a directory template.',
+                                      QtGui.QMessageBox.Ok)
+            return
+
+        if os.path.isdir(dst_path) and os.listdir(dst_path):
+            reply = QtGui.QMessageBox.question(self, 'Directory Exists',
+                                               '<h3>The directory is not empty, copy into it?</h3>'
+                                               '<br>Existing files are overwritten, identical files are skipped.</br>',
+                                               QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
+            if reply != QtGui.QMessageBox.Yes:
+                return
+
+        self.log.info(f'Copying directory: {src_path} >> {dst_path}')
+
+        self._copy_cancel_event = threading.Event()
+        self._copy_task_id = self._task_manager.add_task(tree_copy.copy_tree,
+                                                         task_args=[src_path, dst_path, self._task_copier(),
+                                                                    self._app.get_setting("copy_tree_workers"),
+                                                                    self.copy_progress.emit,
+                                                                    self._copy_cancel_event])
+
+        self.ui.copyFileToFileButton.setEnabled(False)
+        self._copy_progress_widget.start(f'Copying {os.path.basename(src_path)}...')
+
+    def _copy_file_task(self, src_path, dst_paths, copier, cancel_event):
+        """
+        Background task: copy a file to one or more destinations, creating the destination directories if needed
+        :param src_path: str - file to copy
+        :param dst_paths: list of str - destination file paths
+        :param copier: FileCopier - copier of this task, see _task_copier
+        :param cancel_event: threading.Event - set to cancel the copy
+        :return: CopyResult, or list of CopyResult for several destinations
+        """
+        directories.DirectoryCreator().create_parents(dst_paths)
+
+        if len(dst_paths) == 1:
+            return copier.copy(src_path, dst_paths[0], self.copy_progress.emit, cancel_event)
+
+        # The source is read once for all the destinations
+        return copier.copy_many(src_path, dst_paths, self.copy_progress.emit, cancel_event)
+
+    def _task_copier(self):
+        """
+        Copier of a new copy task, with the strategy selected when it starts
+        :return: FileCopier
+        """
+        return self._copier.with_strategy(self._copy_strategy)
+
+    def _on_copy_strategy_changed(self, index):
+        # Only applies to the copies started from now on, the running ones share the copier of their task
+        self._copy_strategy = self._copy_strategy_combo.itemData(index)
 
+    def cancel_copy(self):
+        if self._copy_cancel_event:
+            self.log.info('Cancelling copy')
+            self._copy_cancel_event.set()
+
+    def _on_copy_progress(self, copied, total, elapsed):
+        rate, eta = copy_engine.transfer_rate(copied, total, elapsed)
+
+        message = f'{copy_engine.format_size(copied)} / {copy_engine.format_size(total)}'
+        if rate:
+            message += f' - {copy_engine.format_size(rate)}/s'
+        if eta is not None:
+            message += f' - {copy_engine.format_duration(eta)} left'
+
+        self._copy_progress_widget.set_progress(copied / total if total else 1.0, message)
+
+    def _finish_copy(self):
+        self._copy_task_id = None
+        self._copy_sequence = None
+        self._copy_progress_widget.finish()
+        self.ui.copyFileToFileButton.setEnabled(True)
+
+    def _on_copy_completed(self, uid, group, result):
+        if uid != self._copy_task_id:
+            return
+
+        sequence = self._copy_sequence
+        self._finish_copy()
+
+        if sequence is not None:
+            if result.skipped:
+                message = f'<h3>The {len(sequence)} frames are already up to date, nothing was copied</h3>'
+            else:
+                message = f'<h3>The {len(sequence)} frames were copied successfully</h3>'
+            message += f'<br>{sequence.pattern} {sequence.frame_range}<br>>> {result.dst}</br>'
+
+            QtGui.QMessageBox.information(self, 'Success!', message, QtGui.QMessageBox.Ok)
             self.ui.copyFileLineEdit.clear()
+            return
 
-        except Exception as err:
-            QtGui.QMessageBox.critical(self, 'Failure!',
-                                       f'<h3>The file failed to be copied</h3><br>{err}</br>',
-                                       QtGui.QMessageBox.Ok)
-            self.log.error(f'Failed to copy: {src_path} >> {dst_path}\n{err}')
+        results = result if isinstance(result, list) else [result]
+
+        kind = 'directory' if os.path.isdir(results[0].src) else 'file'
+        if all(r.skipped for r in results):
+            message = f'<h3>The {kind} is already up to date, nothing was copied</h3>'
+        else:
+            message = f'<h3>The {kind} was copied successfully</h3>'
+
+        if len(results) > 1:
+            message += '<br>'.join(r.dst for r in results)
+
+        QtGui.QMessageBox.information(self, 'Success!', message, QtGui.QMessageBox.Ok)
+
+        self.ui.copyFileLineEdit.clear()
+
+    def _on_copy_failed(self, uid, group, msg, stack_trace):
+        if uid != self._copy_task_id:
+            return
+
+        self._finish_copy()
+
+        if self._copy_cancel_event.is_set():
+            self.log.info(msg)
+            return
+
+        QtGui.QMessageBox.critical(self, 'Failure!',
+                                   f'<h3>The file failed to be copied</h3><br>{msg}</br>',
+                                   QtGui.QMessageBox.Ok)
+        self.log.error(f'Failed to copy file\n{msg}\n{stack_trace}')
+
+    def identify_dropped_path(self, path):
+        """
+        Find the template, context and tokens of a dropped file in the background
+        :param path: str - dropped file
+        :return: None
+        """
+        self._path_match_path = path
+        self._path_match_label.setText(f'Looking up the template of {os.path.basename(path)}...')
+        self._path_match_label.setToolTip('')
+        self._path_match_label.show()
+
+        self._path_match_task_id = self._task_manager.add_task(self._path_resolver.from_path, task_args=[path])
+
+    def _on_copy_source_changed(self, text):
+        # The match only describes the file it was looked up for
+        if text != self._path_match_path:
+            self._path_match_path = None
+            self._path_match_task_id = None
+            self._path_match_label.hide()
+
+    def _on_path_match_completed(self, uid, group, result):
+        if uid != self._path_match_task_id:
+            return
+
+        self._path_match_task_id = None
+
+        if result is None:
+            self._path_match_label.setText('The dropped file doesn\'t match any template')
+            return
+
+        tokens = ', '.join(f'{k}={v}' for k, v in sorted(result.tokens.items())) or 'none'
+        self._path_match_label.setText(f'Dropped file matches template <b>{result.template_name}</b><br>'
+                                       f'Context: {result.context}<br>Tokens: {tokens}')
+        self._path_match_label.setToolTip(result.template.definition)
+        self.log.info(f'Dropped file matches template {result.template_name}, context {result.context}, '
+                      f'fields {result.fields}')
+
+    def _on_path_match_failed(self, uid, group, msg, stack_trace):
+        if uid != self._path_match_task_id:
+            return
+
+        self._path_match_task_id = None
+        self._path_match_label.hide()
+        self.log.error(f'Failed to look up the template of the dropped file\n{msg}\n{stack_trace}')
+
+    def ingest_files(self, paths):
+        """
+        Queue dropped files and folders for copying to the current file template, the version
+        and frame keys are incremented so that every file gets a destination of its own
+        :param paths: list of str - dropped files and/or folders
+        :return: None
+        """
+        if self.ui.tkTemplateComboBox.currentIndex() < 1 or not self.template or not self.fields:
+            QtGui.QMessageBox.warning(self, 'No Template',
+                                      'Select an application and a template before dropping files.',
+                                      QtGui.QMessageBox.Ok)
+            return
+
+        missing_keys, valid = self.get_extra_token_definitions()
+        if not valid:
+            QtGui.QMessageBox.warning(self, 'Missing Tokens',
+                                      'Fill in all the extra tokens before dropping files.',
+                                      QtGui.QMessageBox.Ok)
+            return
+
+        fields = dict(self.fields)
+        fields.update(missing_keys)
+
+        if not self.is_path_file(self.ui.filePathLineEdit.text()):
+            # A single folder dropped on a directory template is copied as a tree
+            if len(paths) == 1 and os.path.isdir(paths[0]):
+                self.ui.copyFileLineEdit.setText(paths[0])
+                return
+
+            QtGui.QMessageBox.warning(self, 'Directory Template',
+                                      'Files can only be dropped on a file template.',
+                                      QtGui.QMessageBox.Ok)
+            return
+
+        # Listing the folders and stating every file can take a while on network storage
+        self._ingest_widget.set_summary(f'Resolving {len(paths)} dropped paths...')
+        self._ingest_plan_task_id = self._task_manager.add_task(ingest.plan_items,
+                                                                task_args=[paths, self.template, fields])
+
+    def _on_ingest_plan_completed(self, uid, group, result):
+        if uid != self._ingest_plan_task_id:
+            return
+
+        self._ingest_plan_task_id = None
+        self._update_ingest_summary()
+
+        if not result:
+            return
+
+        reply = QtGui.QMessageBox.question(self, 'Copy Files',
+                                           f'<h3>Copy {len(result)} files?</h3>'
+                                           f'<br>{result[0].src} >> {result[0].dst}</br>',
+                                           QtGui.QMessageBox.Yes | QtGui.QMessageBox.No)
+        if reply != QtGui.QMessageBox.Yes:
+            return
+
+        self.log.info(f'Queuing {len(result)} files for copying to {self.template.definition}')
+
+        items = self._ingest_queue.add_items(result, self._task_copier())
+        self._ingest_widget.add_items(items, copy_engine.format_size)
+        self._update_ingest_summary()
+
+    def _on_ingest_plan_failed(self, uid, group, msg, stack_trace):
+        if uid != self._ingest_plan_task_id:
+            return
+
+        self._ingest_plan_task_id = None
+        self._update_ingest_summary()
+
+        QtGui.QMessageBox.critical(self, 'Failure!',
+                                   f'<h3>Unable to resolve the dropped files</h3><br>{msg}</br>',
+                                   QtGui.QMessageBox.Ok)
+        self.log.error(f'Failed to resolve dropped files\n{msg}\n{stack_trace}')
+
+    def _on_ingest_item_changed(self, item):
+        status = item.status
+        if status == ingest.STATUS_RUNNING and item.size:
+            status = f'{status} {100 * item.copied // item.size}%'
+
+        self._ingest_widget.update_item(item, status)
+        self._update_ingest_summary()
+
+    def _update_ingest_summary(self):
+        stats = self._ingest_queue.stats()
+
+        message = (f"{stats['finished']}/{stats['files']} files - "
+                   f"{copy_engine.format_size(stats['copied'])} / {copy_engine.format_size(stats['total'])}")
+        if stats['rate'] and self._ingest_queue.busy:
+            message += f" - {copy_engine.format_size(stats['rate'])}/s"
+        if stats['eta'] is not None and self._ingest_queue.busy:
+            message += f" - {copy_engine.format_duration(stats['eta'])} left"
+        if stats['failed']:
+            message += f" - {stats['failed']} failed"
+
+        self._ingest_widget.set_summary(message)
+
+    def clear_finished_ingests(self):
+        self._ingest_widget.remove_items(self._ingest_queue.clear_finished())
+        self._update_ingest_summary()
+
+    def create_work_areas(self):
+        """
+        Ask which tasks and applications to create work areas for, and create them in the background
+        :return: None
+        """
+        entity = self.context.entity if self.context else None
+
+        sequence_label = None
+        if entity and entity['type'] in ('Sequence', 'Shot'):
+            sequence_label = (f'All tasks of sequence {entity.get("name")}' if entity['type'] == 'Sequence'
+                              else f'All tasks of the sequence of shot {entity.get("name")}')
+
+        dialog = WorkAreasDialog(self, list(self.applications.keys()), sequence_label)
+        if dialog.exec_() != QtGui.QDialog.Accepted:
+            return
+
+        engines = dict((k, v) for k, v in self.applications.items() if k in dialog.engines())
+        if not engines:
+            return
+
+        self._work_areas_cancel_event = threading.Event()
+        self._work_areas_task_id = self._task_manager.add_task(self._work_areas_task,
+                                                               task_args=[entity if dialog.use_sequence else None,
+                                                                          engines,
+                                                                          self._work_areas_cancel_event])
+
+        self._work_areas_button.setEnabled(False)
+        self._work_areas_progress_widget.start('Finding tasks...')
+
+    def _work_areas_task(self, sequence_entity, engines, cancel_event):
+        """
+        Background task: find the tasks and create their work areas
+        :param sequence_entity: dict - Shot or Sequence whose sequence tasks are used, None for my tasks
+        :param engines: dict - {display name: engine name}
+        :param cancel_event: threading.Event - set to stop
+        :return: list of WorkAreaResult
+        """
+        tk = self._app.sgtk
+
+        if sequence_entity:
+            sequence = work_areas.shot_sequence(tk.shotgun, sequence_entity)
+            if not sequence:
+                raise TankError(f'No sequence found for {sequence_entity["type"]} {sequence_entity.get("name")}')
+            tasks = work_areas.find_tasks(tk.shotgun, self._app.context.project, sequence=sequence)
+
+        else:
+            user = sgtk.util.get_current_user(tk)
+            if not user:
+                raise TankError('Unable to determine the current user')
+            tasks = work_areas.find_tasks(tk.shotgun, self._app.context.project, user=user)
+
+        builder = work_areas.WorkAreaBuilder(tk, engines, self.custom_entity_name_remap, self._app.context_cache,
+                                             self._app.get_setting("work_area_workers"))
+        return builder.build(tasks, self.work_areas_progress.emit, cancel_event)
+
+    def cancel_work_areas(self):
+        if self._work_areas_cancel_event:
+            self.log.info('Cancelling work areas creation')
+            self._work_areas_cancel_event.set()
+
+    def _on_work_areas_progress(self, done, total, message):
+        self._work_areas_progress_widget.set_progress(done / total if total else 1.0, message)
+
+    def _finish_work_areas(self):
+        self._work_areas_task_id = None
+        self._work_areas_progress_widget.finish()
+        self._work_areas_button.setEnabled(True)
+
+    def _on_work_areas_completed(self, uid, group, result):
+        if uid != self._work_areas_task_id:
+            return
+
+        self._finish_work_areas()
+
+        errors = [r for r in result if r.error]
+        created = sum(len(r.directories) for r in result)
+
+        message = f'<h3>Created the work areas of {len(result) - len(errors)} tasks ({created} directories)</h3>'
+        if errors:
+            message += f'<br>{len(errors)} tasks failed:</br><br>'
+            message += '<br>'.join(f'{r.task.get("content")} ({r.task["id"]}): {r.error}' for r in errors[:10])
+
+        QtGui.QMessageBox.information(self, 'Work Areas', message, QtGui.QMessageBox.Ok)
+
+    def _on_work_areas_failed(self, uid, group, msg, stack_trace):
+        if uid != self._work_areas_task_id:
+            return
+
+        self._finish_work_areas()
+
+        QtGui.QMessageBox.critical(self, 'Failure!',
+                                   f'<h3>Failed to create the work areas</h3><br>{msg}</br>',
+                                   QtGui.QMessageBox.Ok)
+        self.log.error(f'Failed to create work areas\n{msg}\n{stack_trace}')
 
     def closeEvent(self, event):
         """
@@ -653,6 +1259,11 @@ class AppDialog(QtGui.QWidget):
 
         self.log.debug("CloseEvent Received. Begin shutting down UI.")
 
+        self._registration_timer.stop()
+        self.cancel_copy()
+        self.cancel_work_areas()
+        self._ingest_queue.shut_down()
+
         # register the data fetcher with the global schema manager
         shotgun_globals.unregister_bg_task_manager(self._task_manager)
 
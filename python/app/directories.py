@@ -0,0 +1,182 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Creation of the missing directories of many paths with as few metadata operations as
+possible, on NFS every exists/makedirs level is a round trip to the filer.
+"""
+
+import os
+from collections import defaultdict
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+
+class DirectoryCreator(object):
+    """
+    Works out which directories of a batch of paths are missing and creates only those.
+
+    A parent whose children are looked up more than once is listed with a single scandir,
+    any other directory is checked with a single stat. Once a directory is known to exist,
+    so are all its parents. Results are cached for the life of the creator, so share one
+    creator between the batches of a single operation.
+
+    Safe to share between threads: concurrent calls may check a directory twice, but a
+    directory created by another thread in the meantime is not an error.
+    """
+
+    def __init__(self):
+        self._known = {}
+        self._listings = {}
+
+        self.listings = 0
+        self.stats = 0
+        self.created = 0
+
+    @staticmethod
+    def _normalize(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    def _list(self, directory):
+        """
+        Names in a directory, from one scandir
+        """
+        listing = self._listings.get(directory)
+        if listing is None:
+            self.listings += 1
+            with os.scandir(directory) as entries:
+                listing = set(entry.name for entry in entries)
+            self._listings[directory] = listing
+
+        return listing
+
+    def _mark_existing(self, path):
+        while path not in self._known or not self._known[path]:
+            self._known[path] = True
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    def _exists(self, path, children):
+        """
+        :param path: str - normalized directory path
+        :param children: dict - {parent: set of children looked up}, decides what gets listed
+        :return: bool
+        """
+        known = self._known.get(path)
+        if known is not None:
+            return known
+
+        parent, name = os.path.split(path)
+        if parent == path:
+            return True
+
+        # Nothing exists under a missing directory
+        if self._known.get(parent) is False:
+            self._known[path] = False
+            return False
+
+        listing = self._listings.get(parent)
+        if listing is None and len(children.get(parent, ())) > 1:
+            if not self._exists(parent, children):
+                self._known[path] = False
+                return False
+
+            listing = self._list(parent)
+
+        if listing is not None:
+            exists = name in listing
+
+        else:
+            self.stats += 1
+            try:
+                os.stat(path)
+                exists = True
+            except (FileNotFoundError, NotADirectoryError):
+                exists = False
+
+        if exists:
+            self._mark_existing(path)
+        else:
+            self._known[path] = False
+
+        return exists
+
+    def missing(self, paths):
+        """
+        Directories to create for a batch of directory paths
+        :param paths: iterable of str - directory paths
+        :return: list of str - missing directories, parents first
+        """
+        targets = set(self._normalize(p) for p in paths if p)
+
+        # Children looked up per parent, a parent looked up for several is worth a listing
+        children = defaultdict(set)
+        for path in targets:
+            parent = os.path.dirname(path)
+            while parent != path:
+                children[parent].add(path)
+                path, parent = parent, os.path.dirname(parent)
+
+        # Sorted, parents are checked before their children
+        missing = set()
+        for path in sorted(targets):
+            while not self._exists(path, children):
+                missing.add(path)
+                path = os.path.dirname(path)
+
+        return sorted(missing)
+
+    def create(self, paths):
+        """
+        Create the missing directories of a batch of directory paths
+        :param paths: iterable of str - directory paths
+        :return: list of str - directories created
+        """
+        created = []
+
+        for path in self.missing(paths):
+            try:
+                os.mkdir(path)
+                created.append(path)
+                self.created += 1
+
+            except FileExistsError:
+                pass
+
+            self._known[path] = True
+            listing = self._listings.get(os.path.dirname(path))
+            if listing is not None:
+                listing.add(os.path.basename(path))
+
+        if created:
+            log.debug(f'Created {len(created)} directories ({self.listings} listings, {self.stats} stats so far)')
+
+        return created
+
+    def create_parents(self, paths):
+        """
+        Create the missing parent directories of a batch of file paths
+        :param paths: iterable of str - file paths
+        :return: list of str - directories created
+        """
+        return self.create(os.path.dirname(p) for p in paths)
+
+
+def create_directories(paths):
+    """
+    Create the missing directories of a batch of directory paths
+    :param paths: iterable of str - directory paths
+    :return: list of str - directories created
+    """
+    return DirectoryCreator().create(paths)
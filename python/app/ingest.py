@@ -0,0 +1,473 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Ingest of many files at once: destinations resolved against a template, and a queue
+copying them concurrently with a limited number of copies per volume.
+Nothing in here may import Qt.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import sgtk
+from tank import TankError
+
+from . import copy_engine
+from .directories import DirectoryCreator
+from .io_scheduler import PRIORITY_BULK
+from .sequences import FRAME_REGEX
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_VOLUME_CONCURRENCY = 2
+
+# Upper bound of version/frame increments tried to find a free destination
+MAX_INCREMENTS = 10000
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'copying'
+STATUS_DONE = 'done'
+STATUS_SKIPPED = 'up to date'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_SKIPPED, STATUS_FAILED, STATUS_CANCELLED)
+
+
+def expand_paths(paths):
+    """
+    Expand dropped files and folders into the files to ingest, hidden files are ignored
+    :param paths: list of str - files and/or folders
+    :return: list of str - file paths, folder contents sorted by path
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+
+        found = []
+        stack = [path]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        found.append(entry.path)
+
+        files.extend(sorted(found))
+
+    return files
+
+
+class DestinationPlanner(object):
+    """
+    Resolves a destination for each ingested file from one template and its fields.
+
+    Frame keys take the frame number of numbered source files, or consecutive numbers
+    for the others. A destination already used by the batch or existing on disk bumps
+    the version key (or the frame of an unnumbered file) until a free path is found,
+    the frames of a sequence all get the first version free for every one of them.
+    """
+
+    def __init__(self, template, fields):
+        """
+        Constructor
+        :param template: Template - file template
+        :param fields: dict - template fields, including the user entered ones
+        """
+        self.template = template
+        self.fields = dict(fields)
+
+        self.frame_keys = [k.name for k in template.keys.values() if isinstance(k, sgtk.templatekey.SequenceKey)]
+
+        version = template.keys.get('version')
+        self.version_key = 'version' if isinstance(version, sgtk.templatekey.IntegerKey) else None
+
+        self._next_frame = 1
+        self._taken = set()
+        self._listings = {}
+
+    def _exists(self, path):
+        """
+        Check if a file exists, listing each destination directory once
+        """
+        directory, name = os.path.split(path)
+        listing = self._listings.get(directory)
+        if listing is None:
+            listing = set(os.listdir(directory)) if os.path.isdir(directory) else set()
+            self._listings[directory] = listing
+
+        return name in listing
+
+    def destination(self, src):
+        """
+        :param src: str - file to ingest
+        :return: str - free destination path
+        """
+        fields = dict(self.fields)
+
+        match = FRAME_REGEX.match(os.path.basename(src)) if self.frame_keys else None
+        if self.frame_keys:
+            if match:
+                frame = int(match.group('frame'))
+            else:
+                frame = self._next_frame
+                self._next_frame += 1
+
+            fields.update((key, frame) for key in self.frame_keys)
+
+        if self.version_key:
+            fields[self.version_key] = int(fields.get(self.version_key) or 1)
+
+        for _ in range(MAX_INCREMENTS):
+            dst = self.template.apply_fields(fields)
+            if dst not in self._taken and not self._exists(dst):
+                self._taken.add(dst)
+                return dst
+
+            if self.version_key:
+                fields[self.version_key] += 1
+
+            elif self.frame_keys and not match:
+                frame = self._next_frame
+                self._next_frame += 1
+                fields.update((key, frame) for key in self.frame_keys)
+
+            else:
+                raise TankError(f'Destination of {src} already exists and the template has no version or frame '
+                                f'key to increment: {dst}')
+
+        raise TankError(f'No free destination found for {src} after {MAX_INCREMENTS} increments')
+
+    def sequence_destinations(self, sources):
+        """
+        Destinations of the frames of one sequence, in the same version
+        :param sources: list of str - numbered files of one sequence
+        :return: list of (source, destination) tuples
+        """
+        frames = [int(FRAME_REGEX.match(os.path.basename(src)).group('frame')) for src in sources]
+        if not self.version_key or len(set(frames)) != len(frames):
+            return [(src, self.destination(src)) for src in sources]
+
+        fields = dict(self.fields)
+        fields[self.version_key] = int(fields.get(self.version_key) or 1)
+
+        for _ in range(MAX_INCREMENTS):
+            destinations = []
+            for frame in frames:
+                fields.update((key, frame) for key in self.frame_keys)
+                destinations.append(self.template.apply_fields(fields))
+
+            if not any(dst in self._taken or self._exists(dst) for dst in destinations):
+                self._taken.update(destinations)
+                return list(zip(sources, destinations))
+
+            fields[self.version_key] += 1
+
+        raise TankError(f'No free version found for the sequence of {sources[0]} after {MAX_INCREMENTS} increments')
+
+    def plan(self, sources):
+        """
+        :param sources: list of str - files to ingest
+        :return: list of (source, destination) tuples, in the order of the sources
+        """
+        # Numbered files sharing a directory, prefix and extension are the frames of one sequence
+        sequences = OrderedDict()
+        for index, src in enumerate(sources):
+            match = FRAME_REGEX.match(os.path.basename(src)) if self.frame_keys else None
+            key = (os.path.dirname(src), match.group('prefix'), match.group('suffix')) if match else index
+            sequences.setdefault(key, []).append(src)
+
+        planned = []
+        for key, group in sequences.items():
+            if isinstance(key, tuple):
+                planned.extend(self.sequence_destinations(group))
+            else:
+                planned.append((group[0], self.destination(group[0])))
+
+        order = {src: index for index, src in enumerate(sources)}
+        return sorted(planned, key=lambda pair: order[pair[0]])
+
+
+class IngestItem(object):
+    """
+    One file of the ingest queue, updated by the worker copying it
+    """
+
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+        self.size = os.path.getsize(src)
+        self.volumes = {copy_engine.volume_id(src), copy_engine.volume_id(dst)}
+
+        self.status = STATUS_PENDING
+        self.copied = 0
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.copier = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+
+def plan_items(paths, template, fields):
+    """
+    Expand dropped files and folders and give each file its destination. Lists folders and
+    stats every file, run it off the GUI thread.
+    :param paths: list of str - dropped files and/or folders
+    :param template: Template - file template
+    :param fields: dict - template fields
+    :return: list of IngestItem
+    """
+    pairs = DestinationPlanner(template, fields).plan(expand_paths(paths))
+    return [IngestItem(src, dst) for src, dst in pairs]
+
+
+class IngestQueue(object):
+    """
+    Copies queued files with a pool of worker threads.
+
+    A file only starts once both its source and destination volume have fewer than
+    volume_concurrency copies running, so a batch spanning several filers keeps all of
+    them busy without queuing every worker on the slowest one.
+    """
+
+    def __init__(self, copier=None, workers=DEFAULT_WORKERS, volume_concurrency=DEFAULT_VOLUME_CONCURRENCY,
+                 item_callback=None):
+        """
+        Constructor
+        :param copier: FileCopier - copier used for each file
+        :param workers: int - maximum number of files copied at once
+        :param volume_concurrency: int - maximum number of files copied at once from/to the same volume
+        :param item_callback: callable - called with the IngestItem whenever its status or progress changes,
+            from the worker threads
+        """
+        self.copier = copier or copy_engine.FileCopier()
+        self.workers = max(1, workers)
+        self.volume_concurrency = max(1, volume_concurrency)
+        self.item_callback = item_callback
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+        self.items = []
+        self._pending = deque()
+        self._active = Counter()
+        self._running = 0
+        self._start = None
+
+        # Running totals of the items, so stats() doesn't go through every item on each progress update
+        self._files = 0
+        self._finished = 0
+        self._failed = 0
+        self._total = 0
+        self._copied = 0
+
+        # Destination directories are shared by the files of a batch, checked once per batch
+        self._directories = DirectoryCreator()
+
+    def add(self, pairs):
+        """
+        Queue files for copying
+        :param pairs: list of (source, destination) tuples
+        :return: list of IngestItem
+        """
+        return self.add_items([IngestItem(src, dst) for src, dst in pairs])
+
+    def add_items(self, items, copier=None):
+        """
+        Queue items built beforehand, ie: on a background thread as IngestItem stats its files
+        :param items: list of IngestItem
+        :param copier: FileCopier - copier of these items, defaults to the copier of the queue
+        :return: list of IngestItem
+        """
+        for item in items:
+            item.copier = copier or self.copier
+
+        with self._lock:
+            if not self._running and not self._pending:
+                self._start = time.monotonic()
+                # Forget the directories of previous batches, they may have been moved since
+                self._directories = DirectoryCreator()
+
+            self.items.extend(items)
+            self._pending.extend(items)
+            self._files += len(items)
+            self._total += sum(i.size for i in items)
+
+        self._dispatch()
+        return items
+
+    def _dispatch(self):
+        """
+        Start the pending files whose volumes have a free slot
+        """
+        started = []
+
+        with self._lock:
+            for item in list(self._pending):
+                if self._running >= self.workers:
+                    break
+
+                if any(self._active[volume] >= self.volume_concurrency for volume in item.volumes):
+                    continue
+
+                self._pending.remove(item)
+                self._running += 1
+                self._active.update(item.volumes)
+                item.status = STATUS_RUNNING
+                started.append(item)
+
+        for item in started:
+            self._notify(item)
+            self._executor.submit(self._run, item)
+
+    def _run(self, item):
+        """
+        Worker: copy one file, then start the files waiting for its volumes
+        """
+        def progress(copied, total, elapsed):
+            with self._lock:
+                self._copied += copied - item.copied
+                item.copied = copied
+            self._notify(item)
+
+        status = STATUS_FAILED
+        try:
+            self._directories.create_parents([item.dst])
+
+            item.result = item.copier.copy(item.src, item.dst, progress, item.cancel_event, PRIORITY_BULK)
+            status = STATUS_SKIPPED if item.result.skipped else STATUS_DONE
+
+        except copy_engine.CopyCancelled:
+            status = STATUS_CANCELLED
+
+        except Exception as err:
+            log.error(f'Failed to ingest {item.src} >> {item.dst}: {err}')
+            item.error = str(err)
+
+        finally:
+            with self._lock:
+                self._set_finished(item, status)
+                self._running -= 1
+                self._active.subtract(item.volumes)
+                self._idle.notify_all()
+
+            self._notify(item)
+            self._dispatch()
+
+    def _set_finished(self, item, status):
+        """
+        Finish an item and update the running totals, call with the lock held
+        """
+        item.status = status
+        self._finished += 1
+
+        if status in (STATUS_CANCELLED, STATUS_FAILED):
+            # No longer counts towards the transfer
+            self._total -= item.size
+            self._copied -= item.copied
+            if status == STATUS_FAILED:
+                self._failed += 1
+        else:
+            self._copied += item.size - item.copied
+            item.copied = item.size
+
+    def _notify(self, item):
+        if self.item_callback:
+            self.item_callback(item)
+
+    def cancel(self, item=None):
+        """
+        Cancel one file, or every file not finished yet
+        :param item: IngestItem - None cancels everything
+        :return: None
+        """
+        with self._lock:
+            items = [item] if item else list(self.items)
+            dropped = [i for i in items if i in self._pending]
+            for pending in dropped:
+                self._pending.remove(pending)
+                self._set_finished(pending, STATUS_CANCELLED)
+            self._idle.notify_all()
+
+        for cancelled in items:
+            cancelled.cancel_event.set()
+
+        for pending in dropped:
+            self._notify(pending)
+
+    def clear_finished(self):
+        """
+        Forget the finished files
+        :return: list of IngestItem - items removed
+        """
+        with self._lock:
+            finished = [i for i in self.items if i.finished]
+            self.items = [i for i in self.items if not i.finished]
+
+            done = [i for i in finished if i.status not in (STATUS_CANCELLED, STATUS_FAILED)]
+            self._files -= len(finished)
+            self._finished -= len(finished)
+            self._failed -= sum(1 for i in finished if i.status == STATUS_FAILED)
+            self._total -= sum(i.size for i in done)
+            self._copied -= sum(i.size for i in done)
+
+        return finished
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._running or self._pending)
+
+    def wait(self, timeout=None):
+        """
+        Block until every queued file is finished
+        :param timeout: float - seconds
+        :return: bool - False if the timeout expired first
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._running and not self._pending, timeout)
+
+    def stats(self):
+        """
+        Aggregate progress of the queue
+        :return: dict - files, finished, failed, total (bytes), copied (bytes), rate (bytes/s), eta (seconds or None)
+        """
+        with self._lock:
+            stats = {'files': self._files,
+                     'finished': self._finished,
+                     'failed': self._failed,
+                     'total': self._total,
+                     'copied': self._copied}
+            start = self._start
+
+        elapsed = time.monotonic() - start if start is not None else 0.0
+        stats['rate'], stats['eta'] = copy_engine.transfer_rate(stats['copied'], stats['total'], elapsed)
+
+        return stats
+
+    def shut_down(self):
+        """
+        Cancel everything and stop the worker threads
+        """
+        self.cancel()
+        self._executor.shutdown(wait=False)
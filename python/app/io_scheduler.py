@@ -0,0 +1,244 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Per volume scheduling of the copies of a session: a limited number of transfers and
+bytes per second per destination volume, small interactive copies served first.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import sgtk
+
+from . import copy_engine
+
+log = sgtk.platform.get_logger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+DEFAULT_MAX_TRANSFERS = 4
+DEFAULT_INTERACTIVE_MAX_SIZE = 64 * 1024 * 1024
+
+# Seconds between checks of the cancel event while waiting
+WAIT_INTERVAL = 0.25
+
+
+class TokenBucket(object):
+    """
+    Thread safe token bucket limiting the bytes per second shared by several transfers
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Constructor
+        :param rate: float - bytes per second
+        :param burst: float - bytes that can be sent at once after being idle, defaults to one second worth
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def consume(self, size, cancel_event=None):
+        """
+        Account for bytes sent, sleeping as long as the bucket is in debt
+        :param size: int - bytes sent
+        :param cancel_event: threading.Event - set it to stop waiting
+        :return: None
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= size
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if delay <= 0:
+            return
+
+        if cancel_event is None:
+            time.sleep(delay)
+        elif cancel_event.wait(delay):
+            raise copy_engine.CopyCancelled('Copy cancelled while throttled')
+
+
+class _Volume(object):
+    """
+    Transfers running on and waiting for a volume
+    """
+
+    def __init__(self, name, max_transfers, bandwidth):
+        self.name = name
+        self.max_transfers = max_transfers
+        self.bucket = TokenBucket(bandwidth) if bandwidth else None
+
+        self.running = 0
+        self.waiting = []
+
+    def has_slot(self):
+        return not self.max_transfers or self.running < self.max_transfers
+
+
+class IOScheduler(object):
+    """
+    Limits the copies of the session per destination volume.
+
+    Each volume runs at most max_transfers copies at once and shares a bandwidth limit
+    between them. Copies waiting for a slot are served by priority class, then in order:
+    copies smaller than interactive_max_size are interactive and jump ahead of bulk transfers.
+    Limits can be overridden per volume by mount point.
+    """
+
+    def __init__(self, max_transfers=DEFAULT_MAX_TRANSFERS, bandwidth=0,
+                 interactive_max_size=DEFAULT_INTERACTIVE_MAX_SIZE, volume_limits=None):
+        """
+        Constructor
+        :param max_transfers: int - concurrent transfers per volume, 0 for no limit
+        :param bandwidth: float - bytes per second per volume, 0 for no limit
+        :param interactive_max_size: int - copies smaller than this are interactive
+        :param volume_limits: dict - {mount point: {'max_transfers': int, 'bandwidth': bytes per second}}
+        """
+        self.max_transfers = max_transfers
+        self.bandwidth = bandwidth
+        self.interactive_max_size = interactive_max_size
+        self.volume_limits = volume_limits or {}
+
+        self._cond = threading.Condition()
+        self._volumes = {}
+        self._order = itertools.count()
+
+    @classmethod
+    def from_app(cls, app):
+        """
+        Create a scheduler configured from the copy_* settings of the app
+        :param app: Application
+        :return: IOScheduler
+        """
+        mb = 1024 * 1024
+        max_transfers = app.get_setting("copy_max_transfers")
+        bandwidth_mb = app.get_setting("copy_bandwidth_limit_mb")
+
+        # Volumes only override the limits they name, the others stay the global ones
+        volume_limits = {}
+        for mount, limits in (app.get_setting("copy_volume_limits") or {}).items():
+            volume_limits[mount] = {'max_transfers': limits.get('max_transfers', max_transfers),
+                                    'bandwidth': limits.get('bandwidth_mb', bandwidth_mb) * mb}
+
+        return cls(max_transfers=max_transfers,
+                   bandwidth=bandwidth_mb * mb,
+                   interactive_max_size=app.get_setting("copy_interactive_max_size_mb") * mb,
+                   volume_limits=volume_limits)
+
+    def priority(self, size):
+        """
+        :param size: int - bytes to copy
+        :return: int - priority class, lower is served first
+        """
+        return PRIORITY_INTERACTIVE if size < self.interactive_max_size else PRIORITY_BULK
+
+    def _limits(self, path):
+        """
+        Limits of the volume of a path, the longest matching mount point wins
+        :return: tuple - (name, max transfers, bandwidth)
+        """
+        path = os.path.abspath(path)
+        matches = [m for m in self.volume_limits
+                   if path == os.path.abspath(m) or path.startswith(os.path.join(os.path.abspath(m), ''))]
+        if not matches:
+            return None, self.max_transfers, self.bandwidth
+
+        mount = max(matches, key=len)
+        limits = self.volume_limits[mount]
+        return mount, limits['max_transfers'], limits['bandwidth']
+
+    def _volume(self, path):
+        """
+        Get the volume of a path, created on first use. Call with the condition held.
+        """
+        key = copy_engine.volume_id(path)
+        volume = self._volumes.get(key)
+        if volume is None:
+            mount, max_transfers, bandwidth = self._limits(path)
+            volume = _Volume(mount or str(key), max_transfers, bandwidth)
+            self._volumes[key] = volume
+
+        return volume
+
+    @contextmanager
+    def transfer(self, dst, size, cancel_event=None, priority=None):
+        """
+        Wait for a transfer slot on the volume of dst, and hold it until the block exits.
+
+        with scheduler.transfer(dst, size, cancel_event) as throttle:
+            for chunk in chunks:
+                write(chunk)
+                throttle(len(chunk))
+
+        :param dst: str - destination path
+        :param size: int - bytes to copy
+        :param cancel_event: threading.Event - set it to stop waiting, raises CopyCancelled
+        :param priority: int - priority class, defaults to the class of the size
+        :return: callable - call with the bytes sent, sleeps to keep within the volume bandwidth
+        """
+        priority = self.priority(size) if priority is None else priority
+        ticket = (priority, next(self._order))
+        start = time.monotonic()
+
+        with self._cond:
+            volume = self._volume(dst)
+            heapq.heappush(volume.waiting, ticket)
+
+            while volume.waiting[0] != ticket or not volume.has_slot():
+                if cancel_event is not None and cancel_event.is_set():
+                    volume.waiting.remove(ticket)
+                    heapq.heapify(volume.waiting)
+                    self._cond.notify_all()
+                    raise copy_engine.CopyCancelled('Copy cancelled while waiting for a transfer slot')
+
+                self._cond.wait(WAIT_INTERVAL)
+
+            heapq.heappop(volume.waiting)
+            volume.running += 1
+            # The next waiting transfer may fit in a slot as well
+            self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        if waited > 1:
+            log.debug(f'Waited {waited:.1f}s for a transfer slot on volume {volume.name}: {dst}')
+
+        bucket = volume.bucket
+        if bucket is None:
+            throttle = None
+        else:
+            def throttle(sent):
+                bucket.consume(sent, cancel_event)
+
+        try:
+            yield throttle
+
+        finally:
+            with self._cond:
+                volume.running -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        """
+        :return: dict - {volume name: {'running': int, 'waiting': int}}
+        """
+        with self._cond:
+            return {v.name: {'running': v.running, 'waiting': len(v.waiting)} for v in self._volumes.values()}
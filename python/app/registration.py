@@ -0,0 +1,162 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+
+class _Registration(object):
+    """
+    State of one registration request, shared between the GUI and the worker thread
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.task_id = None
+        self.started = False
+        self.cancelled = False
+
+
+class ContextRegistrar(object):
+    """
+    Runs context registrations (folder creation + context lookup) on a BackgroundTaskManager.
+
+    Registrations are single-flight: a request for an (entity type, id, engine) already in
+    flight joins the existing task instead of queuing another create_filesystem_structure.
+    Every new request is queued with a higher priority than the previous ones, and calling
+    cancel_obsolete() drops requests that have not started yet, so rapid clicking through
+    tasks/applications only pays for the selections that are still wanted.
+    """
+
+    def __init__(self, tk, bg_task_manager, group='context_registration', context_cache=None):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance
+        :param bg_task_manager: BackgroundTaskManager - task manager to run registrations on
+        :param group: str - task group used for the registration tasks
+        :param context_cache: ContextCache - optional cache for the path cache/context lookups
+        """
+        self.tk = tk
+        self.context_cache = context_cache
+        self.group = group
+        self._task_manager = bg_task_manager
+
+        self._lock = threading.Lock()
+        self._priority = 0
+
+        # registrations in flight by (entity type, id, engine) and by task id
+        self._by_key = {}
+        self._by_task_id = {}
+
+    def request(self, typ, idd, engine, progress_callback=None):
+        """
+        Request the registration of an entity, joining the registration in flight if there is one
+        :param typ: str - entity type
+        :param idd: int - entity id
+        :param engine: str - engine used for the folder creation
+        :param progress_callback: callable - called with a status message from the worker thread
+        :return: task id whose completion delivers the Context
+        """
+        key = (typ, idd, engine)
+
+        with self._lock:
+            registration = self._by_key.get(key)
+            if registration is not None:
+                log.debug(f'Joining registration in flight for {key}')
+                return registration.task_id
+
+            registration = _Registration(key)
+            self._by_key[key] = registration
+
+            # The newest selection is always processed first
+            self._priority += 1
+            priority = self._priority
+
+        task_id = self._task_manager.add_task(self._register,
+                                              priority=priority,
+                                              group=self.group,
+                                              task_args=[registration, progress_callback])
+
+        with self._lock:
+            registration.task_id = task_id
+            self._by_task_id[task_id] = registration
+
+        return task_id
+
+    def cancel_obsolete(self, keep_task_id=None):
+        """
+        Cancel the registrations that have not started yet, except the one still wanted.
+        Registrations already running are left to finish so they can still be joined.
+        :param keep_task_id: task id of the registration the UI is waiting for
+        :return: None
+        """
+        with self._lock:
+            obsolete = [r for r in self._by_task_id.values() if r.task_id != keep_task_id and not r.started]
+
+            for registration in obsolete:
+                registration.cancelled = True
+                del self._by_task_id[registration.task_id]
+                del self._by_key[registration.key]
+
+        for registration in obsolete:
+            log.debug(f'Cancelling obsolete registration for {registration.key}')
+            self._task_manager.stop_task(registration.task_id)
+
+    def finished(self, task_id):
+        """
+        Forget a registration once the task manager reported it as completed or failed
+        :param task_id: task id
+        :return: (entity type, id, engine) or None if the task isn't a registration
+        """
+        with self._lock:
+            registration = self._by_task_id.pop(task_id, None)
+            if registration is None:
+                return None
+
+            self._by_key.pop(registration.key, None)
+
+        return registration.key
+
+    def _register(self, registration, progress_callback):
+        """
+        Background task: make sure the entity is registered with Toolkit and build its context
+        :param registration: _Registration - request being processed
+        :param progress_callback: callable - called with a status message
+        :return: Context or None when cancelled before starting
+        """
+        with self._lock:
+            if registration.cancelled:
+                return None
+            registration.started = True
+
+        typ, idd, tkengine = registration.key
+        progress = progress_callback or (lambda message: None)
+
+        # ContextCache mirrors the Sgtk methods used here
+        tk = self.context_cache or self.tk
+
+        # Check if Context is already registered in Toolkit, if not, then register it
+        progress('Checking the Toolkit path cache...')
+        paths = tk.paths_from_entity(typ, idd)
+
+        if not paths:
+            try:
+                progress('Creating folder structure on disk...')
+                log.info('Creating folder structure on disk')
+                tk.create_filesystem_structure(typ, idd, engine=tkengine)
+
+            except Exception as err:
+                log.error(f'Failed to create folder structure for {typ} {idd}: {err}')
+
+        progress('Building Toolkit context...')
+        return tk.context_from_entity(typ, idd)
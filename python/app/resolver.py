@@ -0,0 +1,259 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Headless naming convention logic, shared by the dialog and by batch/farm tools.
+Nothing in here may import Qt.
+"""
+
+import os
+from collections import namedtuple
+
+import sgtk
+from tank import TankError
+
+from . import versions
+from .template_index import get_template_index
+
+log = sgtk.platform.get_logger(__name__)
+
+
+ResolvedPath = namedtuple('ResolvedPath', ['file_name', 'directory', 'file_path', 'is_file', 'template', 'fields'])
+
+PathMatch = namedtuple('PathMatch', ['template_name', 'template', 'fields', 'context', 'tokens'])
+
+
+def normalize_engine_name(engine_key, display_name=''):
+    """
+    Convert a tk-engines value into the engine token used in template names
+    ie: tk-maya > maya, Motion Builder > motionbuilder
+    Non-engine definitions without a value fall back to the display name ie: Data > data
+    :param engine_key: str - engine name as defined in the tk-engines setting
+    :param display_name: str - tk-engines key, used when engine_key is empty
+    :return: str
+    """
+    if engine_key:
+        return str(engine_key).lower().replace(' ', '').replace('tk-', '')
+
+    return str(display_name).lower()
+
+
+def remap_entity_type(entity_type, entity_remap=None):
+    """
+    Apply the custom_entity_name_remap setting to a Shotgun entity type
+    :param entity_type: str - Shotgun entity type ie: CustomEntity01
+    :param entity_remap: dict - custom_entity_name_remap setting
+    :return: str - lower case entity token ie: take
+    """
+    if entity_remap:
+        entity_type = entity_remap.get(entity_type, entity_type)
+
+    return entity_type.lower()
+
+
+def context_entity(context):
+    """
+    Get the deepest entity of a context that Toolkit can register, task > step > entity
+    :param context: Context
+    :return: tuple - (entity type, entity id)
+    """
+    for entity in (context.task, context.step, context.source_entity):
+        if entity:
+            return entity['type'], entity['id']
+
+    raise TankError('Unable to determine Context Entity and ID, check current Context.')
+
+
+def apply_frame(path, frame=1):
+    """
+    Replace any frame padding left in a path (ie: %04d) with a frame number
+    :param path: str - path from Template.apply_fields
+    :param frame: int - frame number
+    :return: str
+    """
+    try:
+        return path % frame
+
+    except (TypeError, ValueError):
+        return path
+
+
+def sequence_pattern(template, fields):
+    """
+    Apply fields to a template, leaving the frame number(s) as printf style padding
+    ie: /shots/sh010/comp/sh010_comp.%04d.exr
+    :param template: Template
+    :param fields: dict - template fields
+    :return: str or None if the template has no sequence key
+    """
+    fields = dict(fields)
+    seq_keys = [k for k in template.keys.values() if isinstance(k, sgtk.templatekey.SequenceKey)]
+    if not seq_keys:
+        return None
+
+    for key in seq_keys:
+        fields[key.name] = 'FORMAT: %d'
+
+    return template.apply_fields(fields)
+
+
+def is_path_file(path):
+    """
+    Check if the path has a file extension, assume its a file, if not its a directory
+    :param path: str - directory/file path
+    :return: bool
+    """
+    tmp = os.path.splitext(path)
+    if len(tmp) > 1 and tmp[1]:
+        return True
+
+    return False
+
+
+class PathResolver(object):
+    """
+    Resolves file name, directory and file path of a template for a context without any UI
+    """
+
+    def __init__(self, tk, entity_remap=None):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance
+        :param entity_remap: dict - custom_entity_name_remap setting
+        """
+        self.tk = tk
+        self.entity_remap = entity_remap or {}
+
+    def templates_for(self, context, engine_key, display_name=''):
+        """
+        Get the templates available for a context and engine
+        :param context: Context - context with an entity
+        :param engine_key: str - engine name as defined in the tk-engines setting
+        :param display_name: str - tk-engines key, used when engine_key is empty
+        :return: list of (template name, Template) tuples sorted by template name
+        """
+        entity_type = remap_entity_type(context.entity['type'], self.entity_remap)
+        app_name = normalize_engine_name(engine_key, display_name)
+
+        return get_template_index(self.tk).lookup(entity_type, app_name)
+
+    def get_template(self, template):
+        """
+        :param template: str or Template - template name or object
+        :return: Template
+        """
+        if not isinstance(template, str):
+            return template
+
+        template_obj = self.tk.templates.get(template)
+        if template_obj is None:
+            raise TankError(f'Template not defined in the pipeline configuration: {template}')
+
+        return template_obj
+
+    def context_fields(self, context, template):
+        """
+        Fields the context provides for a template
+        :param context: Context
+        :param template: Template
+        :return: dict
+        """
+        return context.as_template_fields(template)
+
+    def next_version(self, context, template, tokens=None):
+        """
+        Next free version of a template for a context, from one listing of its version directory
+        :param context: Context - registered Toolkit context
+        :param template: str or Template - template name or object
+        :param tokens: dict - values for the keys the context doesn't provide, see resolve()
+        :return: int - next version, or None if the template has no version key or can't be resolved
+        """
+        template = self.get_template(template)
+        fields = self.context_fields(context, template)
+
+        for key, value in (tokens or {}).items():
+            if key in template.keys and key != versions.VERSION_KEY:
+                fields[key] = template.keys[key].value_from_str(value) if isinstance(value, str) else value
+
+        return versions.next_version(template, fields)
+
+    def from_path(self, path):
+        """
+        Reverse resolve a path: the template it belongs to, its fields and its context
+        :param path: str - file or directory path
+        :return: PathMatch, tokens holding the fields the context doesn't provide, or None if no template matches
+        """
+        matches = get_template_index(self.tk).match_path(path)
+        if not matches:
+            return None
+
+        if len(matches) > 1:
+            log.debug(f'{path} matches {len(matches)} templates, using {matches[0][0]}: '
+                      f'{", ".join(m[0] for m in matches[1:])}')
+
+        name, template, fields = matches[0]
+        context = self.tk.context_from_path(path)
+        context_fields = self.context_fields(context, template)
+        tokens = dict((k, v) for k, v in fields.items() if k not in context_fields)
+
+        return PathMatch(name, template, fields, context, tokens)
+
+    def resolve(self, context, template, tokens=None, frame=1):
+        """
+        Resolve a template for a context
+        :param context: Context - registered Toolkit context
+        :param template: str or Template - template name or object
+        :param tokens: dict - values for the keys the context doesn't provide, strings are
+                       converted using the template key type. Keys left out use their default.
+        :param frame: int - value used to fill in any frame padding
+        :return: ResolvedPath
+        """
+        template = self.get_template(template)
+        fields = self.context_fields(context, template)
+
+        return self.resolve_fields(template, fields, tokens, frame)
+
+    def resolve_fields(self, template, fields, tokens=None, frame=1):
+        """
+        Resolve a template from already gathered context fields
+        :param template: Template
+        :param fields: dict - context fields, not modified
+        :param tokens: dict - extra token values, see resolve()
+        :param frame: int - value used to fill in any frame padding
+        :return: ResolvedPath
+        """
+        fields = dict(fields)
+        tokens = tokens or {}
+
+        for key in template.missing_keys(fields):
+            key_obj = template.keys[key]
+
+            if key in tokens:
+                value = tokens[key]
+                if isinstance(value, str):
+                    value = key_obj.value_from_str(value)
+                fields[key] = value
+
+            elif key_obj.default is not None:
+                fields[key] = key_obj.default
+
+        missing_keys = template.missing_keys(fields)
+        if missing_keys:
+            raise TankError(f'Missing values for template {template.name}: {", ".join(missing_keys)}')
+
+        file_path = apply_frame(template.apply_fields(fields), frame)
+        is_file = is_path_file(file_path)
+
+        return ResolvedPath(file_name=os.path.basename(file_path) if is_file else '',
+                            directory=os.path.dirname(file_path),
+                            file_path=file_path,
+                            is_file=is_file,
+                            template=template,
+                            fields=fields)
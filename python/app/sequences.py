@@ -0,0 +1,163 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Image sequence detection and parallel copy of all frames of a sequence.
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+import sgtk
+
+from . import copy_engine
+from .directories import create_directories
+from .io_scheduler import PRIORITY_BULK
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_WORKERS = 8
+
+# <prefix><frame digits><.extension> ie: plate_v001.1001.exr, plate_1001.exr
+FRAME_REGEX = re.compile(r'^(?P<prefix>.*?)(?P<frame>\d+)(?P<suffix>\.[^.\d][^.]*)$')
+
+
+class Sequence(object):
+    """
+    Frames of an image sequence on disk
+    """
+
+    def __init__(self, directory, prefix, padding, suffix, frames):
+        """
+        Constructor
+        :param directory: str - directory of the frames
+        :param prefix: str - file name before the frame number
+        :param padding: int - number of digits of the frame number
+        :param suffix: str - file name after the frame number, including the extension
+        :param frames: list of int - sorted frame numbers
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.padding = padding
+        self.suffix = suffix
+        self.frames = frames
+
+    def path(self, frame):
+        """
+        :param frame: int
+        :return: str - file path of a frame
+        """
+        return os.path.join(self.directory, f'{self.prefix}{frame:0{self.padding}d}{self.suffix}')
+
+    @property
+    def pattern(self):
+        """
+        :return: str - path with printf style frame padding ie: /plates/plate.%04d.exr
+        """
+        return os.path.join(self.directory, f'{self.prefix}%0{self.padding}d{self.suffix}')
+
+    @property
+    def frame_range(self):
+        """
+        :return: str - ie: 1001-1100 (100 frames)
+        """
+        return f'{self.frames[0]}-{self.frames[-1]} ({len(self.frames)} frames)'
+
+    def __len__(self):
+        return len(self.frames)
+
+
+def find_sequence(path):
+    """
+    Find the sequence a frame belongs to, listing its directory once
+    :param path: str - file path of any frame of the sequence
+    :return: Sequence or None if the file isn't part of a sequence of at least two frames
+    """
+    directory, file_name = os.path.split(path)
+    match = FRAME_REGEX.match(file_name)
+    if not match:
+        return None
+
+    prefix = match.group('prefix')
+    suffix = match.group('suffix')
+    padding = len(match.group('frame'))
+
+    frames = []
+    with os.scandir(directory or '.') as entries:
+        for entry in entries:
+            name = entry.name
+            if not (name.startswith(prefix) and name.endswith(suffix)):
+                continue
+
+            digits = name[len(prefix):len(name) - len(suffix)]
+            # Unpadded frames can be longer than the padding, never shorter
+            if digits.isdigit() and (len(digits) == padding or (len(digits) > padding and digits[0] != '0')):
+                frames.append(int(digits))
+
+    if len(frames) < 2:
+        return None
+
+    frames.sort()
+    return Sequence(directory, prefix, padding, suffix, frames)
+
+
+def copy_sequence(sequence, dst_pattern, copier=None, workers=DEFAULT_WORKERS, progress_callback=None,
+                  cancel_event=None):
+    """
+    Copy every frame of a sequence with a bounded pool of worker threads.
+    Per file latency dominates on network filers, copying frames in parallel hides it.
+    :param sequence: Sequence - frames to copy
+    :param dst_pattern: str - destination path with printf style frame padding ie: /shots/plate.%04d.exr
+    :param copier: FileCopier - copier used for each frame
+    :param workers: int - maximum number of frames copied at once
+    :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+    :param cancel_event: threading.Event - set it to cancel the copy, frames already copied are kept
+    :return: CopyResult
+    """
+    copier = copier or copy_engine.FileCopier()
+    cancel_event = cancel_event or threading.Event()
+
+    create_directories([os.path.dirname(dst_pattern)])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        sizes = list(executor.map(os.path.getsize, [sequence.path(f) for f in sequence.frames]))
+        progress = copy_engine.ProgressAggregator(sum(sizes), progress_callback)
+
+        futures = [executor.submit(copier.copy, sequence.path(frame), dst_pattern % frame,
+                                   progress.file_callback(frame), cancel_event, PRIORITY_BULK)
+                   for frame in sequence.frames]
+
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+
+        errors = [f.exception() for f in done if f.exception() is not None]
+        if errors:
+            # Stop the frames still running and drop the ones not started
+            cancel_event.set()
+            for future in not_done:
+                future.cancel()
+            wait(not_done)
+            raise errors[0]
+
+    elapsed = time.monotonic() - progress.start
+    methods = set(f.result().method for f in futures)
+    skipped = all(f.result().skipped for f in futures)
+
+    rate, _ = copy_engine.transfer_rate(progress.total, progress.total, elapsed)
+    log.info(f'Copied {len(sequence)} frames, {copy_engine.format_size(progress.total)} in {elapsed:.2f}s '
+             f'({copy_engine.format_size(rate)}/s, {workers} workers): {sequence.pattern} >> {dst_pattern}')
+
+    if progress_callback:
+        progress_callback(progress.total, progress.total, elapsed)
+
+    return copy_engine.CopyResult(sequence.pattern, dst_pattern, progress.total, elapsed, ', '.join(sorted(methods)),
+                                  skipped)
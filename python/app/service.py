@@ -0,0 +1,411 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Local naming service: keeps Toolkit, the template index and the context caches warm in a
+long running process, and answers resolution requests of DCCs without Toolkit integration
+in milliseconds. The client is python/naming_client.py, which doesn't need sgtk.
+
+    tank naming_service [address]
+
+Requests are JSON-RPC 2.0, one JSON object per line, over a Unix socket in a directory only
+the user can access, or over a localhost TCP port where Unix sockets aren't available. Any
+local user can reach the port, so TCP connections must first authenticate with the token the
+service writes to the private runtime directory of the user.
+Nothing in here may import Qt.
+"""
+
+import getpass
+import hmac
+import inspect
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+import sgtk
+from tank import TankError
+
+from . import batch
+from .template_index import get_template_index
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_PORT = 47321
+
+ADDRESS_ENV = 'NAMING_SERVICE_ADDRESS'
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+UNAUTHORIZED = -32001
+
+SOCKET_NAME = 'naming-service.sock'
+TOKEN_NAME = 'naming-service.token'
+
+
+def runtime_dir():
+    """
+    Directory only the user can access, holding the socket and token of the service.
+    Keep in sync with naming_client.runtime_dir.
+    :return: str - $XDG_RUNTIME_DIR, %LOCALAPPDATA%\\naming-service on Windows, or <temp>/naming-service-<user>
+    """
+    if sys.platform == 'win32':
+        return os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'naming-service')
+
+    return os.environ.get('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(),
+                                                             f'naming-service-{getpass.getuser()}')
+
+
+def _private_dir(path):
+    """
+    Create a directory only the user can access, or check an existing one is
+    :param path: str - directory
+    :return: None
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if sys.platform == 'win32':
+        return
+
+    stat = os.stat(path)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        raise TankError(f'{path} must belong to the current user and only be accessible by them')
+
+
+def default_address():
+    """
+    Address of the service of the current user, the NAMING_SERVICE_ADDRESS environment
+    variable wins. Keep in sync with naming_client.default_address.
+    :return: str - unix:<socket path> or <host>:<port>
+    """
+    address = os.environ.get(ADDRESS_ENV)
+    if address:
+        return address
+
+    if sys.platform == 'win32' or not hasattr(socket, 'AF_UNIX'):
+        return f'127.0.0.1:{DEFAULT_PORT}'
+
+    return 'unix:' + os.path.join(runtime_dir(), SOCKET_NAME)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the requests of a connection, one line each, until the client disconnects.
+    Connections to a server with a token are closed unless their first request authenticates.
+    """
+
+    def handle(self):
+        authenticated = self.server.token is None
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            if authenticated:
+                response = self.server.service.handle_line(line)
+            else:
+                authenticated, response = self.server.service.authenticate(line, self.server.token)
+
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+            if not authenticated:
+                break
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    token = None
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    token = None
+
+
+class NamingService(object):
+    """
+    Resolves templates for the clients of the session.
+
+    Toolkit and the Shotgun connection are not thread safe, so connections are served on
+    their own threads but requests are answered one at a time. The resolver caches (Task
+    lookups, context fields) are dropped every context_cache_ttl seconds so Tasks created
+    since are found, the contexts themselves expire through the app context cache.
+    """
+
+    def __init__(self, app, address=None):
+        """
+        Constructor
+        :param app: Application
+        :param address: str - unix:<socket path> or <host>:<port>, defaults to the service_address setting
+        """
+        self.app = app
+        self.address = address or app.get_setting("service_address") or default_address()
+        self.ttl = app.get_setting("context_cache_ttl")
+
+        self._lock = threading.Lock()
+        self._batch = None
+        self._batch_created = 0
+        self._server = None
+        self._start = time.monotonic()
+
+        self.requests = 0
+        self.errors = 0
+
+        self._methods = {
+            'ping': self.ping,
+            'resolve': self.resolve,
+            'next_version': self.next_version,
+            'templates': self.templates,
+            'from_path': self.from_path,
+            'stats': self.stats,
+        }
+
+    def _resolver(self):
+        """
+        Get the batch resolver, recreated once its caches are older than the context cache TTL
+        :return: BatchResolver
+        """
+        if self._batch is None or time.monotonic() - self._batch_created > self.ttl:
+            self._batch = batch.BatchResolver(self.app.sgtk,
+                                              self.app.get_setting("tk-engines"),
+                                              self.app.get_setting("custom_entity_name_remap"),
+                                              context_cache=self.app.context_cache)
+            self._batch_created = time.monotonic()
+
+        return self._batch
+
+    def _context(self, task=None, entity_type=None, entity_id=None, engine=None):
+        """
+        Get the registered context of a Task or entity
+        :return: tuple - (BatchResolver, Context)
+        """
+        batch_resolver = self._resolver()
+        typ, idd = batch_resolver.row_entity({'task': task, 'entity_type': entity_type, 'entity_id': entity_id})
+        engine = batch_resolver.engine_name(engine) if engine else None
+
+        return batch_resolver, batch_resolver.get_context(typ, idd, engine)
+
+    def handle_line(self, line):
+        """
+        Answer a JSON-RPC request
+        :param line: bytes - request
+        :return: dict - JSON-RPC response
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            return self._error(None, PARSE_ERROR, f'Invalid JSON: {err}')
+
+        if not isinstance(request, dict) or not isinstance(request.get('params', {}), dict):
+            return self._error(None, INVALID_REQUEST, 'Requests must be objects with named params')
+
+        request_id = request.get('id')
+        method = self._methods.get(request.get('method'))
+        if method is None:
+            return self._error(request_id, METHOD_NOT_FOUND, f'Unknown method: {request.get("method")}')
+
+        params = request.get('params', {})
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as err:
+            return self._error(request_id, INVALID_PARAMS, str(err))
+
+        start = time.monotonic()
+        try:
+            with self._lock:
+                self.requests += 1
+                result = method(**params)
+
+        except Exception as err:
+            if not isinstance(err, TankError):
+                log.exception(f'Naming service request failed: {request}')
+            return self._error(request_id, SERVER_ERROR, str(err))
+
+        log.debug(f'{request.get("method")} answered in {(time.monotonic() - start) * 1000:.1f}ms')
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+
+    def authenticate(self, line, token):
+        """
+        Check the first request of a TCP connection: authenticate with the token of the service
+        :param line: bytes - request
+        :param token: str - token of the service
+        :return: tuple - (bool authenticated, dict JSON-RPC response)
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            return False, self._error(None, PARSE_ERROR, f'Invalid JSON: {err}')
+
+        if not isinstance(request, dict) or not isinstance(request.get('params', {}), dict):
+            return False, self._error(None, INVALID_REQUEST, 'Requests must be objects with named params')
+
+        if request.get('method') != 'authenticate' or \
+                not hmac.compare_digest(str(request.get('params', {}).get('token', '')), token):
+            log.warning('Naming service connection refused, it did not authenticate')
+            return False, self._error(request.get('id'), UNAUTHORIZED,
+                                      f'Authenticate first with the token in {os.path.join(runtime_dir(), TOKEN_NAME)}')
+
+        return True, {'jsonrpc': '2.0', 'id': request.get('id'), 'result': True}
+
+    def _error(self, request_id, code, message):
+        self.errors += 1
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+    def ping(self):
+        return {'pid': os.getpid(), 'uptime': round(time.monotonic() - self._start, 1)}
+
+    def resolve(self, template, task=None, entity_type=None, entity_id=None, engine=None, tokens=None, frame=1):
+        """
+        Resolve a template, see naming_client.NamingClient.resolve
+        :return: dict
+        """
+        batch_resolver, context = self._context(task, entity_type, entity_id, engine)
+
+        template = batch_resolver.resolver.get_template(template)
+        fields = batch_resolver.resolver.context_fields(context, template)
+        resolved = batch_resolver.resolver.resolve_fields(template, fields, tokens, frame)
+
+        return {'file_name': resolved.file_name, 'directory': resolved.directory, 'file_path': resolved.file_path,
+                'is_file': resolved.is_file, 'fields': resolved.fields}
+
+    def next_version(self, template, task=None, entity_type=None, entity_id=None, engine=None, tokens=None):
+        batch_resolver, context = self._context(task, entity_type, entity_id, engine)
+        return batch_resolver.resolver.next_version(context, template, tokens)
+
+    def templates(self, engine, task=None, entity_type=None, entity_id=None):
+        batch_resolver, context = self._context(task, entity_type, entity_id, engine)
+
+        # tk-engines key (ie: Maya, Data) or engine name (ie: tk-maya)
+        if engine in batch_resolver.engines:
+            display_name, engine_key = engine, batch_resolver.engines[engine]
+        else:
+            display_name, engine_key = '', engine
+
+        return [name for name, _ in batch_resolver.resolver.templates_for(context, engine_key, display_name)]
+
+    def from_path(self, path):
+        match = self._resolver().resolver.from_path(path)
+        if match is None:
+            return None
+
+        return {'template': match.template_name, 'fields': match.fields, 'context': str(match.context),
+                'tokens': match.tokens}
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors, 'context_cache': self.app.context_cache.stats()}
+
+    def _bind(self):
+        """
+        Create the server on the service address, replacing the socket of a service that died.
+        TCP servers get a new token, written to a file only the user can read.
+        :return: socketserver.BaseServer
+        """
+        if not self.address.startswith('unix:'):
+            host, port = self.address.rsplit(':', 1)
+            if host not in ('127.0.0.1', 'localhost', '::1'):
+                raise TankError(f'The naming service only listens on localhost: {self.address}')
+
+            server = _TCPServer((host, int(port)), _RequestHandler)
+            server.token = self._write_token()
+            return server
+
+        path = self.address[len('unix:'):]
+        _private_dir(os.path.dirname(path))
+
+        if os.path.exists(path):
+            if os.stat(path).st_uid != os.getuid():
+                raise TankError(f'{path} belongs to another user')
+
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                raise TankError(f'A naming service is already running on {self.address}')
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(path)
+            finally:
+                probe.close()
+
+        # The directory already keeps other users out, the socket is restricted as well
+        server = _UnixServer(path, _RequestHandler)
+        os.chmod(path, 0o600)
+        return server
+
+    def _write_token(self):
+        """
+        Write a new token for TCP clients, readable by the user only
+        :return: str - token
+        """
+        directory = runtime_dir()
+        _private_dir(directory)
+
+        path = os.path.join(directory, TOKEN_NAME)
+        if os.path.exists(path):
+            os.remove(path)
+
+        token = secrets.token_hex(32)
+        with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as handle:
+            handle.write(token)
+
+        return token
+
+    def serve_forever(self):
+        """
+        Answer requests until shut_down is called
+        :return: None
+        """
+        self._server = self._bind()
+        self._server.service = self
+
+        # Warm up before the first request: template index and Shotgun connection
+        get_template_index(self.app.sgtk).path_cursor()
+        log.info(f'Naming service listening on {self.address}')
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if self.address.startswith('unix:') and os.path.exists(self.address[len('unix:'):]):
+                os.remove(self.address[len('unix:'):])
+            if self._server.token is not None and os.path.exists(os.path.join(runtime_dir(), TOKEN_NAME)):
+                os.remove(os.path.join(runtime_dir(), TOKEN_NAME))
+
+    def shut_down(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def run_command(app_instance, *args):
+    """
+    Command callback: naming_service [address]
+    Blocks until interrupted, or runs in the background in engines with a UI (ie: tk-desktop).
+    :param app_instance: Application
+    :return: None
+    """
+    service = NamingService(app_instance, args[0] if args else None)
+
+    if app_instance.engine.has_ui:
+        thread = threading.Thread(target=service.serve_forever, name='NamingService', daemon=True)
+        thread.start()
+        return
+
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        log.info('Naming service stopped')
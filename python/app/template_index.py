@@ -0,0 +1,290 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import re
+import threading
+import weakref
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+# One index per Sgtk instance, dropped automatically when the instance goes away
+_INDEXES = weakref.WeakKeyDictionary()
+_INDEXES_LOCK = threading.Lock()
+
+# Keys and optional sections of a template definition
+_KEY_REGEX = re.compile(r'\{[^}]*\}|[\[\]]')
+
+
+def get_template_index(tk):
+    """
+    Return the shared template index for a Toolkit instance, building it on first use
+    :param tk: Sgtk - Toolkit instance
+    :return: TemplateIndex
+    """
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(tk)
+        if index is None:
+            index = TemplateIndex(tk)
+            _INDEXES[tk] = index
+
+    return index
+
+
+class TemplateIndex(object):
+    """
+    Maps "<entity>_<engine>" template name spans to the sorted list of matching templates.
+
+    Template names are split on "_" and every contiguous run of two or more tokens is
+    registered, so "shot_maya_work" is reachable via "shot_maya", "maya_work" and
+    "shot_maya_work". Looking up an (entity, engine) pair is then a single dict access
+    instead of a regex search over every entry in tk.templates.
+
+    Paths are reverse resolved through a trie of the path components of the template
+    definitions, see _PathNode, so only the few templates sharing the static components
+    of a path are tested instead of every template in turn.
+
+    The index is rebuilt only when the templates of the pipeline configuration are
+    reloaded (tk.templates is replaced by a new dictionary).
+    """
+
+    def __init__(self, tk):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance whose templates are indexed
+        """
+        self._tk = weakref.ref(tk)
+        self._lock = threading.Lock()
+        self._templates = None
+        self._index = {}
+        self._trie = _PathNode()
+
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+
+    def lookup(self, entity_type, engine_name):
+        """
+        Get the templates defined for an entity type and engine
+        :param entity_type: str - remapped, lower case entity type ie: shot
+        :param engine_name: str - normalized engine name ie: maya
+        :return: list of (template name, Template) tuples sorted by template name
+        """
+        self._ensure_built()
+
+        result = self._index.get(f'{entity_type}_{engine_name}')
+
+        if result:
+            self.hits += 1
+            return list(result)
+
+        self.misses += 1
+        return []
+
+    def path_cursor(self):
+        """
+        Start a walk down the path trie, one path component at a time. Walks of many
+        paths under the same directory can share the cursor of the directory.
+        :return: PathCursor - at the root, before the first path component
+        """
+        self._ensure_built()
+        return PathCursor([self._trie])
+
+    def templates_from_path(self, path):
+        """
+        Get the templates whose static path components match a path, the only ones worth
+        testing with Template.validate_and_get_fields
+        :param path: str - file or directory path
+        :return: list of (template name, Template) tuples, most specific first
+        """
+        cursor = self.path_cursor()
+        for name in split_path(path):
+            cursor = cursor.child(name)
+            if cursor.dead:
+                break
+
+        return cursor.candidates()
+
+    def match_path(self, path):
+        """
+        Reverse resolve a path, like tk.template_from_path but only testing the candidates
+        that share the static components of the path
+        :param path: str - file or directory path
+        :return: list of (template name, Template, fields) tuples, most specific first
+        """
+        matches = []
+        for name, template in self.templates_from_path(path):
+            fields = template.validate_and_get_fields(path)
+            if fields is not None:
+                matches.append((name, template, fields))
+
+        return matches
+
+    def stats(self):
+        """
+        Index usage counters, handy when logging cache efficiency
+        :return: dict
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'builds': self.builds,
+                'keys': len(self._index),
+                'path_nodes': self._trie.count()}
+
+    def _ensure_built(self):
+        """
+        (Re)build the index if the Toolkit templates have changed since the last build
+        :return: None
+        """
+        tk = self._tk()
+        if tk is None:
+            return
+
+        templates = tk.templates
+        if templates is self._templates:
+            return
+
+        with self._lock:
+            if templates is self._templates:
+                return
+
+            index = {}
+            for name in sorted(templates):
+                tokens = name.split('_')
+                spans = set()
+                for start in range(len(tokens) - 1):
+                    for end in range(start + 2, len(tokens) + 1):
+                        spans.add('_'.join(tokens[start:end]))
+
+                for span in spans:
+                    index.setdefault(span, []).append((name, templates[name]))
+
+            trie = _PathNode()
+            for name in sorted(templates):
+                trie.add(name, templates[name])
+
+            self._index = index
+            self._trie = trie
+            self._templates = templates
+            self.builds += 1
+
+        log.debug(f'Built template index: {len(templates)} templates, {len(index)} keys')
+
+
+def split_path(path):
+    """
+    Split a path into normalized components, the same way for template definitions and
+    for the paths looked up
+    """
+    return os.path.normcase(path).replace('\\', '/').rstrip('/').split('/')
+
+
+class PathCursor(object):
+    """
+    Position of a walk down the path trie: the nodes reached by the components so far, and
+    the templates with an optional section spanning components met on the way.
+    """
+
+    def __init__(self, nodes, partial=()):
+        self.nodes = nodes
+        self.partial = partial
+
+    @property
+    def dead(self):
+        """
+        No template can match a path going through here
+        """
+        return not self.nodes and not self.partial
+
+    def child(self, name):
+        """
+        :param name: str - next normalized path component, see split_path
+        :return: PathCursor
+        """
+        partial = self.partial
+        for node in self.nodes:
+            if node.partial:
+                partial = partial + tuple(node.partial)
+
+        return PathCursor([child for node in self.nodes for child in node.children_for(name)], partial)
+
+    def candidates(self):
+        """
+        Templates the path walked so far may match, more static characters is more specific
+        :return: list of (template name, Template) tuples, most specific first
+        """
+        exact = sorted((entry for node in self.nodes for entry in node.templates), key=lambda e: (-e[0], e[1]))
+        partial = sorted(self.partial, key=lambda e: (-e[0], e[1]))
+
+        return [(name, template) for _, name, template in exact + partial]
+
+
+class _PathNode(object):
+    """
+    Prefix trie of the path components of template definitions.
+
+    Static components are exact children. Components with keys are wildcard children
+    keyed on their static start and end ie: {Shot}_comp_v{version}.ma > ('', '.ma').
+    Templates are stored where their definition ends, or where an optional section
+    spanning several components makes the depth unknown (partial matches).
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.wildcards = {}
+        self.templates = []
+        self.partial = []
+
+    def add(self, name, template):
+        root_path = getattr(template, 'root_path', None)
+        if root_path is None:
+            # TemplateString, not a path
+            return
+
+        definition = template.definition
+        path = os.path.join(root_path, definition)
+        static = len(path) - sum(len(k) for k in _KEY_REGEX.findall(definition))
+
+        node = self
+        depth = 0
+        for component in split_path(path):
+            # Optional section across components ie: [/{name}], from here any depth may match
+            depth += component.count('[') - component.count(']')
+            if depth:
+                node.partial.append((static, name, template))
+                return
+
+            if '{' in component or '[' in component:
+                start = min(i for i in (component.find('{'), component.find('[')) if i > -1)
+                end = max(component.rfind('}'), component.rfind(']')) + 1
+                node = node.wildcards.setdefault((component[:start], component[end:]), _PathNode())
+            else:
+                node = node.children.setdefault(component, _PathNode())
+
+        node.templates.append((static, name, template))
+
+    def children_for(self, name):
+        """
+        :param name: str - normalized path component
+        :return: list of _PathNode - children matching the component
+        """
+        children = [node for (start, end), node in self.wildcards.items()
+                    if len(name) >= len(start) + len(end) and name.startswith(start) and name.endswith(end)]
+
+        child = self.children.get(name)
+        if child is not None:
+            children.append(child)
+
+        return children
+
+    def count(self):
+        return 1 + sum(n.count() for n in list(self.children.values()) + list(self.wildcards.values()))
@@ -0,0 +1,185 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Parallel copy of a directory tree into a directory template ie: *_render_folder
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import sgtk
+
+from . import copy_engine
+from .directories import DirectoryCreator
+from .io_scheduler import PRIORITY_BULK
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_WORKERS = 16
+
+
+def scan_tree(root):
+    """
+    List a directory tree with one scandir per directory, the sizes come from the listing
+    :param root: str - directory
+    :return: tuple - (list of relative directory paths, list of (relative file path, size))
+    """
+    directories = []
+    files = []
+    stack = ['']
+
+    while stack:
+        relative = stack.pop()
+        with os.scandir(os.path.join(root, relative)) as entries:
+            for entry in entries:
+                path = os.path.join(relative, entry.name)
+
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(path)
+                    stack.append(path)
+
+                elif entry.is_file():
+                    files.append((path, entry.stat().st_size))
+
+                elif entry.is_symlink():
+                    log.warning(f'Skipping symlink to a directory: {entry.path}')
+
+    directories.sort()
+    return directories, files
+
+
+def create_directories(root, directories):
+    """
+    Create the missing directories of a tree in one pass, parents first. Nothing is checked
+    under a new root, merging into an existing tree lists each existing parent once.
+    :param root: str - destination directory
+    :param directories: list of str - relative directory paths
+    :return: int - number of directories created
+    """
+    return len(DirectoryCreator().create([root] + [os.path.join(root, d) for d in directories]))
+
+
+class WorkStealingPool(object):
+    """
+    Runs tasks on threads that each own a deque of tasks. A thread works through its own
+    deque from the back and, once it is empty, steals from the front of the others, so a
+    few large files don't leave the other threads idle at the end of the copy.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(1, workers)
+
+    def run(self, tasks, func, cancel_event=None):
+        """
+        Call func on every task, stopping at the first error
+        :param tasks: list - tasks, split in contiguous runs between the threads
+        :param func: callable - called with a task
+        :param cancel_event: threading.Event - set it to stop, set on the first error
+        :return: None
+        """
+        cancel_event = cancel_event or threading.Event()
+        workers = min(self.workers, len(tasks)) or 1
+
+        # Contiguous runs keep the files of a directory on the same thread
+        size = -(-len(tasks) // workers)
+        queues = [deque(tasks[i * size:(i + 1) * size]) for i in range(workers)]
+        errors = []
+
+        def work(index):
+            own = queues[index]
+            others = queues[index + 1:] + queues[:index]
+
+            while not cancel_event.is_set():
+                try:
+                    task = own.pop()
+                except IndexError:
+                    task = self._steal(others)
+                    if task is None:
+                        return
+
+                try:
+                    func(task)
+
+                except BaseException as err:
+                    errors.append(err)
+                    cancel_event.set()
+                    return
+
+        threads = [threading.Thread(target=work, args=(i,), daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _steal(queues):
+        for queue in queues:
+            try:
+                return queue.popleft()
+            except IndexError:
+                continue
+
+        return None
+
+
+def copy_tree(src, dst, copier=None, workers=DEFAULT_WORKERS, progress_callback=None, cancel_event=None):
+    """
+    Copy a directory tree: one scandir pass over the source, the directories created in one
+    pass, then the files copied by a work stealing thread pool.
+    Files already identical in the destination are skipped by the copier.
+    :param src: str - source directory
+    :param dst: str - destination directory, merged into if it exists
+    :param copier: FileCopier - copier used for each file
+    :param workers: int - maximum number of files copied at once
+    :param progress_callback: callable - called with (bytes copied, total bytes, elapsed seconds)
+    :param cancel_event: threading.Event - set it to cancel the copy, files already copied are kept
+    :return: CopyResult
+    """
+    copier = copier or copy_engine.FileCopier()
+    cancel_event = cancel_event or threading.Event()
+    start = time.monotonic()
+
+    directories, files = scan_tree(src)
+    created = create_directories(dst, directories)
+    log.info(f'Scanned {len(files)} files in {len(directories) + 1} directories, created {created} directories '
+             f'in {time.monotonic() - start:.2f}s: {src} >> {dst}')
+
+    progress = copy_engine.ProgressAggregator(sum(size for _, size in files), progress_callback)
+    results = []
+
+    def copy_file(task):
+        relative, _ = task
+        results.append(copier.copy(os.path.join(src, relative), os.path.join(dst, relative),
+                                   progress.file_callback(relative), cancel_event, PRIORITY_BULK))
+
+    WorkStealingPool(workers).run(files, copy_file, cancel_event)
+
+    if cancel_event.is_set():
+        raise copy_engine.CopyCancelled(f'Copy cancelled: {src} >> {dst}')
+
+    elapsed = time.monotonic() - start
+    skipped = sum(1 for r in results if r.skipped)
+    methods = set(r.method for r in results)
+
+    rate, _ = copy_engine.transfer_rate(progress.total, progress.total, elapsed)
+    log.info(f'Copied {len(files) - skipped} files ({skipped} up to date), {copy_engine.format_size(progress.total)} '
+             f'in {elapsed:.2f}s ({copy_engine.format_size(rate)}/s, {workers} workers): {src} >> {dst}')
+
+    if progress_callback:
+        progress_callback(progress.total, progress.total, elapsed)
+
+    return copy_engine.CopyResult(src, dst, progress.total, elapsed, ', '.join(sorted(methods)),
+                                  bool(files) and skipped == len(files))
@@ -0,0 +1,52 @@
+from sgtk.platform.qt import QtCore, QtGui
+
+
+class CopyProgressWidget(QtGui.QWidget):
+    """
+    Progress bar, transfer rate/ETA label and cancel button for background copies
+    """
+
+    cancel_requested = QtCore.Signal()
+
+    def __init__(self, parent):
+        super(CopyProgressWidget, self).__init__(parent)
+
+        layout = QtGui.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.progress_bar = QtGui.QProgressBar(self)
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        self.status_label = QtGui.QLabel(self)
+        layout.addWidget(self.status_label)
+
+        self.cancel_button = QtGui.QPushButton('Cancel', self)
+        self.cancel_button.setToolTip('Cancel the copy and remove the partially copied file')
+        self.cancel_button.released.connect(self._on_cancel)
+        layout.addWidget(self.cancel_button)
+
+        self.hide()
+
+    def start(self, message):
+        self.progress_bar.setValue(0)
+        self.status_label.setText(message)
+        self.cancel_button.setEnabled(True)
+        self.show()
+
+    def set_progress(self, fraction, message):
+        """
+        :param fraction: float - 0.0 to 1.0
+        :param message: str - status text ie: 1.2 GB / 4.0 GB - 250.0 MB/s - 12s left
+        """
+        self.progress_bar.setValue(int(fraction * 1000))
+        self.status_label.setText(message)
+
+    def finish(self):
+        self.hide()
+
+    def _on_cancel(self):
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText('Cancelling...')
+        self.cancel_requested.emit()
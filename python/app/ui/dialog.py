@@ -17,6 +17,8 @@ for name, cls in QtGui.__dict__.items():
     if isinstance(cls, type): globals()[name] = cls
 
 
+from .dragdroplineedit import DragDropLineEdit
+
 from  . import resources_rc
 
 class Ui_Form(object):
@@ -226,7 +228,7 @@ class Ui_Form(object):
 
         self.horizontalLayout.addWidget(self.label_9)
 
-        self.copyFileLineEdit = QLineEdit(Form)
+        self.copyFileLineEdit = DragDropLineEdit(Form)
         self.copyFileLineEdit.setObjectName(u"copyFileLineEdit")
 
         self.horizontalLayout.addWidget(self.copyFileLineEdit)
@@ -1,33 +1,40 @@
-import sys
+import os
+
 from sgtk.platform.qt import QtCore, QtGui
 
 
 class DragDropLineEdit(QtGui.QLineEdit):
+    # Emitted with the local paths when several files, or a folder, are dropped
+    paths_dropped = QtCore.Signal(list)
+
+    # Emitted with the local path when a single file is dropped
+    path_dropped = QtCore.Signal(str)
+
     def __init__(self, parent):
         super(DragDropLineEdit, self).__init__(parent)
 
         self.setDragEnabled(True)
 
+    @staticmethod
+    def _local_paths(event):
+        # toLocalFile handles the leading "/" of Windows drive paths ie: "/X:/temp"
+        return [str(url.toLocalFile()) for url in event.mimeData().urls() if url.scheme() == 'file']
+
     def dragEnterEvent(self, event):
-        data = event.mimeData()
-        urls = data.urls()
-        if urls and urls[0].scheme() == 'file':
+        if self._local_paths(event):
             event.acceptProposedAction()
 
     def dragMoveEvent(self, event):
-        data = event.mimeData()
-        urls = data.urls()
-        if urls and urls[0].scheme() == 'file':
+        if self._local_paths(event):
             event.acceptProposedAction()
 
     def dropEvent(self, event):
-        data = event.mimeData()
-        urls = data.urls()
-        if urls and urls[0].scheme() == 'file':
-            # for some reason, this doubles up the intro slash
-            filepath = str(urls[0].path())[1:]  # Windows/OSX returns a "/" at start of file path ie: "/X:/temp"
-
-            if sys.platform == 'linux2':    # Linux doesn't return "/" at start of file path
-                filepath = str(urls[0].path())
-
-            self.setText(filepath)
+        paths = self._local_paths(event)
+        if not paths:
+            return
+
+        if len(paths) > 1 or os.path.isdir(paths[0]):
+            self.paths_dropped.emit(paths)
+        else:
+            self.setText(paths[0])
+            self.path_dropped.emit(paths[0])
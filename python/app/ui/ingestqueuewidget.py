@@ -0,0 +1,85 @@
+from sgtk.platform.qt import QtCore, QtGui
+
+
+class IngestQueueWidget(QtGui.QWidget):
+    """
+    List of the files of the ingest queue with their status, and the aggregate throughput of the queue
+    """
+
+    cancel_requested = QtCore.Signal()
+    clear_requested = QtCore.Signal()
+
+    COLUMNS = ['File', 'Destination', 'Size', 'Status']
+
+    def __init__(self, parent):
+        super(IngestQueueWidget, self).__init__(parent)
+
+        layout = QtGui.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.tree = QtGui.QTreeWidget(self)
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
+        layout.addWidget(self.tree)
+
+        footer = QtGui.QHBoxLayout()
+        layout.addLayout(footer)
+
+        self.summary_label = QtGui.QLabel(self)
+        footer.addWidget(self.summary_label, 1)
+
+        self.clear_button = QtGui.QPushButton('Clear Finished', self)
+        self.clear_button.released.connect(self.clear_requested.emit)
+        footer.addWidget(self.clear_button)
+
+        self.cancel_button = QtGui.QPushButton('Cancel All', self)
+        self.cancel_button.setToolTip('Cancel the files not copied yet')
+        self.cancel_button.released.connect(self.cancel_requested.emit)
+        footer.addWidget(self.cancel_button)
+
+        # tree items by queue item
+        self._rows = {}
+
+        self.hide()
+
+    def add_items(self, items, size_formatter=str):
+        """
+        :param items: list of IngestItem
+        :param size_formatter: callable - formats a size in bytes
+        """
+        for item in items:
+            row = QtGui.QTreeWidgetItem([item.src, item.dst, size_formatter(item.size), item.status])
+            row.setToolTip(0, item.src)
+            row.setToolTip(1, item.dst)
+            self.tree.addTopLevelItem(row)
+            self._rows[item] = row
+
+        self.tree.resizeColumnToContents(2)
+        self.show()
+
+    def update_item(self, item, status):
+        """
+        :param item: IngestItem
+        :param status: str - status text ie: copying 42%
+        """
+        row = self._rows.get(item)
+        if row is None:
+            return
+
+        row.setText(3, status)
+        if item.error:
+            row.setToolTip(3, item.error)
+
+    def remove_items(self, items):
+        for item in items:
+            row = self._rows.pop(item, None)
+            if row is not None:
+                self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(row))
+
+        if not self._rows:
+            self.hide()
+
+    def set_summary(self, message):
+        self.summary_label.setText(message)
@@ -0,0 +1,52 @@
+from sgtk.platform.qt import QtCore, QtGui
+
+
+class WorkAreasDialog(QtGui.QDialog):
+    """
+    Pick the Tasks (assigned to me or of a sequence) and the engines to create work areas for
+    """
+
+    def __init__(self, parent, engines, sequence_label=None):
+        """
+        :param parent: QWidget
+        :param engines: list of str - tk-engines display names
+        :param sequence_label: str - describes the sequence of the current context, None if there is none
+        """
+        super(WorkAreasDialog, self).__init__(parent)
+
+        self.setWindowTitle('Create Work Areas')
+
+        layout = QtGui.QVBoxLayout(self)
+
+        self.my_tasks_radio = QtGui.QRadioButton('All tasks assigned to me', self)
+        self.my_tasks_radio.setChecked(True)
+        layout.addWidget(self.my_tasks_radio)
+
+        self.sequence_radio = QtGui.QRadioButton(sequence_label or 'All tasks of the current sequence', self)
+        self.sequence_radio.setEnabled(bool(sequence_label))
+        layout.addWidget(self.sequence_radio)
+
+        layout.addWidget(QtGui.QLabel('Create the directories of the templates of:', self))
+
+        self.engine_list = QtGui.QListWidget(self)
+        for engine in engines:
+            item = QtGui.QListWidgetItem(engine, self.engine_list)
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            item.setCheckState(QtCore.Qt.Checked)
+        layout.addWidget(self.engine_list)
+
+        buttons = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel, parent=self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    @property
+    def use_sequence(self):
+        return self.sequence_radio.isChecked()
+
+    def engines(self):
+        """
+        :return: list of str - checked tk-engines display names
+        """
+        items = [self.engine_list.item(i) for i in range(self.engine_list.count())]
+        return [item.text() for item in items if item.checkState() == QtCore.Qt.Checked]
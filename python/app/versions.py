@@ -0,0 +1,166 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Discovery of the next free version of a template from a single listing of the directory
+holding the versions. Nothing in here may import Qt.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import sgtk
+
+log = sgtk.platform.get_logger(__name__)
+
+VERSION_KEY = 'version'
+
+# Stands in for the version while applying fields, then becomes the regex capture group
+VERSION_SENTINEL = 987654321
+
+MAX_ENTRIES = 256
+
+
+def version_pattern(template, fields, version_key=VERSION_KEY):
+    """
+    Split a template into the directory listing its versions and a regex matching the
+    names in that directory, the version captured
+    ie: /shots/sh010/work/maya, ^sh010_comp_v(\\d+)\\.ma$
+    :param template: Template
+    :param fields: dict - template fields, any version is ignored
+    :param version_key: str - name of the version IntegerKey
+    :return: tuple - (directory, compiled regex) or None if the fields can't resolve the template
+    """
+    if version_key not in template.keys:
+        return None
+
+    fields = dict(fields)
+    fields[version_key] = VERSION_SENTINEL
+
+    # Keys left to the artist use their default, frames match any number
+    for name, key in template.keys.items():
+        if isinstance(key, sgtk.templatekey.SequenceKey):
+            fields[name] = 'FORMAT: %d'
+        elif name not in fields and key.default is not None:
+            fields[name] = key.default
+
+    if template.missing_keys(fields):
+        return None
+
+    path = os.path.normpath(template.apply_fields(fields))
+    parts = path.split(os.sep)
+    sentinel = str(VERSION_SENTINEL)
+
+    for index, part in enumerate(parts):
+        if sentinel in part:
+            directory = os.sep.join(parts[:index]) or os.sep
+            regex = re.escape(part).replace(sentinel, r'(\d+)')
+            regex = re.sub(r'%0?\d*d|(?:\\#)+', r'\\d+', regex)
+            return directory, re.compile(f'^{regex}$')
+
+    return None
+
+
+class VersionIndex(object):
+    """
+    Highest existing version per (directory, name pattern), the directory listed with a single
+    scandir. Entries are kept until the directory mtime changes, which it does whenever a
+    version is added or removed, so a cached lookup costs one stat.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """
+        Constructor
+        :param max_entries: int - (directory, pattern) entries kept, least recently used dropped first
+        """
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def latest(self, directory, regex):
+        """
+        Highest version in a directory
+        :param directory: str - directory to list
+        :param regex: compiled regex - matches the names of the versions, the version in group 1
+        :return: int - highest version, 0 if there is none
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return 0
+
+        key = (directory, regex.pattern)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        latest = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    match = regex.match(entry.name)
+                    if match:
+                        latest = max(latest, int(match.group(1)))
+        except (FileNotFoundError, NotADirectoryError):
+            return 0
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (mtime, latest)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return latest
+
+    def next_version(self, template, fields, version_key=VERSION_KEY):
+        """
+        Next free version of a template
+        :param template: Template
+        :param fields: dict - template fields, any version is ignored
+        :param version_key: str - name of the version IntegerKey
+        :return: int - highest existing version + 1, or None if the fields can't resolve the template
+        """
+        pattern = version_pattern(template, fields, version_key)
+        if pattern is None:
+            return None
+
+        return self.latest(*pattern) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_index = VersionIndex()
+
+
+def next_version(template, fields, version_key=VERSION_KEY):
+    """
+    Next free version of a template, from the index shared by the session
+    :param template: Template
+    :param fields: dict - template fields, any version is ignored
+    :param version_key: str - name of the version IntegerKey
+    :return: int - highest existing version + 1, or None if the fields can't resolve the template
+    """
+    return _index.next_version(template, fields, version_key)
@@ -0,0 +1,258 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Bulk creation of the work areas of many Tasks: the Toolkit folder structure of every
+Task and the directories of every directory template of the chosen engines.
+Nothing in here may import Qt.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import sgtk
+from tank import TankError
+
+from . import resolver
+from .directories import DirectoryCreator
+
+log = sgtk.platform.get_logger(__name__)
+
+DEFAULT_WORKERS = 8
+
+# Tasks registered per create_filesystem_structure call
+REGISTER_BATCH_SIZE = 50
+
+WorkAreaResult = namedtuple('WorkAreaResult', ['task', 'directories', 'error'])
+
+
+def find_tasks(sg, project=None, user=None, sequence=None):
+    """
+    Find the Tasks to create work areas for
+    :param sg: Shotgun - Shotgun API instance
+    :param project: dict - Project entity, None for every project
+    :param user: dict - HumanUser entity, only the Tasks assigned to them
+    :param sequence: dict - Sequence entity, only the Tasks of its Shots
+    :return: list of Task dicts
+    """
+    filters = []
+    if project:
+        filters.append(['project', 'is', project])
+    if user:
+        filters.append(['task_assignees', 'is', user])
+    if sequence:
+        filters.append(['entity.Shot.sg_sequence', 'is', sequence])
+
+    return sg.find('Task', filters, ['content', 'entity', 'step'], order=[{'field_name': 'id', 'direction': 'asc'}])
+
+
+def shot_sequence(sg, entity):
+    """
+    Get the Sequence of a context entity
+    :param sg: Shotgun - Shotgun API instance
+    :param entity: dict - Sequence or Shot entity
+    :return: dict - Sequence entity or None
+    """
+    if not entity:
+        return None
+
+    if entity['type'] == 'Sequence':
+        return entity
+
+    if entity['type'] == 'Shot':
+        shot = sg.find_one('Shot', [['id', 'is', entity['id']]], ['sg_sequence'])
+        return shot.get('sg_sequence') if shot else None
+
+    return None
+
+
+class WorkAreaBuilder(object):
+    """
+    Registers Tasks with Toolkit and creates the directories of their directory templates.
+
+    The folder structure is created for batches of Tasks in single create_filesystem_structure
+    calls, one batch at a time as the path cache is a single database. While a batch is being
+    registered, worker threads build the contexts and create the directories of the previous ones.
+    """
+
+    def __init__(self, tk, engines, entity_remap=None, context_cache=None, workers=DEFAULT_WORKERS):
+        """
+        Constructor
+        :param tk: Sgtk - Toolkit instance
+        :param engines: dict - {display name: engine name} subset of the tk-engines setting
+        :param entity_remap: dict - custom_entity_name_remap setting
+        :param context_cache: ContextCache - optional cache for the context lookups
+        :param workers: int - contexts/directories built at once
+        """
+        self.tk = tk
+        self.engines = engines
+        self.context_cache = context_cache
+        self.workers = max(1, workers)
+        self.resolver = resolver.PathResolver(tk, entity_remap)
+
+        self._lock = threading.Lock()
+        self._errors = {}
+
+        # Shared by all tasks, the sequence/shot directories are listed once for the whole build
+        self._directories = DirectoryCreator()
+
+    def build(self, tasks, progress_callback=None, cancel_event=None):
+        """
+        Create the work areas of Tasks
+        :param tasks: list of Task dicts
+        :param progress_callback: callable - called with (Tasks done, Tasks total, message)
+        :param cancel_event: threading.Event - set it to stop, Tasks done are kept
+        :return: list of WorkAreaResult, in the order of tasks
+        """
+        cancel_event = cancel_event or threading.Event()
+        progress = progress_callback or (lambda done, total, message: None)
+        start = time.monotonic()
+
+        done = [0]
+        total = len(tasks)
+
+        def task_done(future):
+            with self._lock:
+                done[0] += 1
+                count = done[0]
+            progress(count, total, f'Created work areas of {count} of {total} tasks')
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for index in range(0, total, REGISTER_BATCH_SIZE):
+                if cancel_event.is_set():
+                    break
+
+                batch = tasks[index:index + REGISTER_BATCH_SIZE]
+                progress(done[0], total, f'Creating folder structure of tasks {index + 1}-{index + len(batch)} '
+                                         f'of {total}')
+                self._register(batch)
+
+                for task in batch:
+                    future = pool.submit(self._create, task, cancel_event)
+                    future.add_done_callback(task_done)
+                    futures.append(future)
+
+        results = [f.result() for f in futures]
+
+        created = sum(len(r.directories) for r in results)
+        errors = sum(1 for r in results if r.error)
+        log.info(f'Created the work areas of {len(results)} tasks ({created} directories, {errors} errors) '
+                 f'in {time.monotonic() - start:.2f}s')
+
+        return results
+
+    def _register(self, tasks):
+        """
+        Create the folder structure of a batch of Tasks, Task by Task if the batch fails
+        """
+        ids = [t['id'] for t in tasks]
+        engines = [e for e in self.engines.values() if e] or [None]
+
+        for engine in engines:
+            try:
+                self.tk.create_filesystem_structure('Task', ids, engine=engine)
+
+            except Exception as err:
+                log.warning(f'Failed to create the folder structure of {len(ids)} tasks at once ({err}), '
+                            f'retrying task by task')
+
+                for idd in ids:
+                    try:
+                        self.tk.create_filesystem_structure('Task', idd, engine=engine)
+                    except Exception as task_err:
+                        self._errors[idd] = str(task_err)
+
+        if self.context_cache:
+            for idd in ids:
+                self.context_cache.invalidate('Task', idd)
+
+    def _create(self, task, cancel_event):
+        """
+        Worker: create the directories of every directory template of a Task
+        :return: WorkAreaResult
+        """
+        if cancel_event.is_set():
+            return WorkAreaResult(task, [], 'Cancelled')
+
+        error = self._errors.get(task['id'])
+        if error:
+            return WorkAreaResult(task, [], error)
+
+        try:
+            context = (self.context_cache or self.tk).context_from_entity('Task', task['id'])
+            directories = self.directories(context)
+
+            self._directories.create(directories)
+
+            return WorkAreaResult(task, directories, None)
+
+        except Exception as err:
+            log.error(f'Failed to create the work areas of task {task["id"]}: {err}')
+            return WorkAreaResult(task, [], str(err))
+
+    def directories(self, context):
+        """
+        Resolve the directory templates of the engines that the context fully provides
+        :param context: Context - registered Task context
+        :return: list of str - directory paths
+        """
+        directories = set()
+
+        for display_name, engine in self.engines.items():
+            for name, template in self.resolver.templates_for(context, engine, display_name):
+                try:
+                    resolved = self.resolver.resolve(context, template)
+                except TankError:
+                    # Needs tokens only the artist can provide ie: name
+                    continue
+
+                if not resolved.is_file:
+                    directories.add(resolved.file_path)
+
+        return sorted(directories)
+
+
+def run_command(app_instance, *args):
+    """
+    Command callback: create_work_areas [sequence id] [engine ...]
+    Without a sequence id, the work areas of the Tasks assigned to the current user are created.
+    :param app_instance: Application
+    :return: None
+    """
+    args = list(args)
+    sg = app_instance.shotgun
+
+    sequence = None
+    user = None
+    if args and str(args[0]).isdigit():
+        sequence = {'type': 'Sequence', 'id': int(args.pop(0))}
+    else:
+        user = sgtk.util.get_current_user(app_instance.sgtk)
+        if not user:
+            log.error('Usage: create_work_areas [sequence id] [engine ...], unable to determine the current user')
+            return
+
+    engines = app_instance.get_setting("tk-engines")
+    if args:
+        engines = dict((k, v) for k, v in engines.items() if k in args or v in args)
+
+    tasks = find_tasks(sg, app_instance.context.project, user, sequence)
+    log.info(f'Creating the work areas of {len(tasks)} tasks for {", ".join(engines)}')
+
+    builder = WorkAreaBuilder(app_instance.sgtk, engines,
+                              app_instance.get_setting("custom_entity_name_remap"),
+                              app_instance.context_cache,
+                              app_instance.get_setting("work_area_workers"))
+    for result in builder.build(tasks):
+        if result.error:
+            log.error(f'Task {result.task["id"]}: {result.error}')
@@ -0,0 +1,253 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Client of the naming service (see app/service.py) for DCCs without Toolkit. Only uses the
+standard library, add this directory to sys.path and import the module on its own:
+
+    import sys
+    sys.path.append('/path/to/foto-multi-namingconvention/python')
+    import naming_client
+
+    client = naming_client.NamingClient()
+    path = client.resolve('shot_nuke_render', task=1234, tokens={'name': 'beauty'})['file_path']
+"""
+
+import getpass
+import itertools
+import json
+import os
+import socket
+import sys
+import tempfile
+
+DEFAULT_PORT = 47321
+DEFAULT_TIMEOUT = 30
+
+ADDRESS_ENV = 'NAMING_SERVICE_ADDRESS'
+
+SOCKET_NAME = 'naming-service.sock'
+TOKEN_NAME = 'naming-service.token'
+
+
+def runtime_dir():
+    """
+    Directory only the user can access, holding the socket and token of the service.
+    Keep in sync with service.runtime_dir.
+    :return: str - $XDG_RUNTIME_DIR, %LOCALAPPDATA%\\naming-service on Windows, or <temp>/naming-service-<user>
+    """
+    if sys.platform == 'win32':
+        return os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'naming-service')
+
+    return os.environ.get('XDG_RUNTIME_DIR') or os.path.join(tempfile.gettempdir(),
+                                                             f'naming-service-{getpass.getuser()}')
+
+
+def default_address():
+    """
+    Address of the service of the current user, the NAMING_SERVICE_ADDRESS environment
+    variable wins. Keep in sync with service.default_address.
+    :return: str - unix:<socket path> or <host>:<port>
+    """
+    address = os.environ.get(ADDRESS_ENV)
+    if address:
+        return address
+
+    if sys.platform == 'win32' or not hasattr(socket, 'AF_UNIX'):
+        return f'127.0.0.1:{DEFAULT_PORT}'
+
+    return 'unix:' + os.path.join(runtime_dir(), SOCKET_NAME)
+
+
+def connect(address, timeout=DEFAULT_TIMEOUT):
+    """
+    :param address: str - unix:<socket path> or <host>:<port>
+    :param timeout: float - seconds
+    :return: socket.socket
+    """
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        # Don't send requests to a socket another user put in place
+        if os.stat(path).st_uid != os.getuid():
+            raise PermissionError(f'{path} belongs to another user')
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(path)
+        return sock
+
+    host, port = address.rsplit(':', 1)
+    return socket.create_connection((host, int(port)), timeout)
+
+
+class NamingServiceError(Exception):
+    """
+    Error returned by the service, ie: an unknown template or a missing token
+    """
+
+    def __init__(self, message, code=None):
+        super(NamingServiceError, self).__init__(message)
+        self.code = code
+
+
+def read_token():
+    """
+    Token TCP connections authenticate with, written by the service when it starts
+    :return: str
+    """
+    path = os.path.join(runtime_dir(), TOKEN_NAME)
+    try:
+        with open(path) as handle:
+            return handle.read().strip()
+    except FileNotFoundError:
+        raise NamingServiceError(f'No naming service token in {path}, is the service running?')
+
+
+class NamingClient(object):
+    """
+    Sends requests to the naming service over one connection, reconnecting once if the
+    service was restarted since the last request. A connection that timed out is dropped.
+    """
+
+    def __init__(self, address=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Constructor
+        :param address: str - service address, see default_address
+        :param timeout: float - seconds to wait for an answer, the first request for a task
+                        may register it with Toolkit
+        """
+        self.address = address or default_address()
+        self.timeout = timeout
+
+        self._sock = None
+        self._stream = None
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._stream.close()
+            self._sock.close()
+            self._sock = None
+            self._stream = None
+
+    def call(self, method, **params):
+        """
+        Send a request and wait for the answer
+        :param method: str - service method ie: resolve
+        :param params: method parameters
+        :return: result of the method
+        """
+        for attempt in range(2):
+            try:
+                if self._sock is None:
+                    self._connect()
+                response = self._request(method, params)
+                break
+
+            except socket.timeout:
+                # The stream can't be read from anymore and the answer may still come, start over next call
+                self.close()
+                raise
+
+            except OSError:
+                self.close()
+                if attempt:
+                    raise
+
+        return self._result(response)
+
+    def _connect(self):
+        """
+        Connect to the service, TCP connections authenticate with the token of the service
+        :return: None
+        """
+        self._sock = connect(self.address, self.timeout)
+        self._stream = self._sock.makefile('rwb')
+
+        if not self.address.startswith('unix:'):
+            try:
+                self._result(self._request('authenticate', {'token': read_token()}))
+            except NamingServiceError:
+                self.close()
+                raise
+
+    def _result(self, response):
+        error = response.get('error')
+        if error:
+            raise NamingServiceError(error.get('message'), error.get('code'))
+
+        return response.get('result')
+
+    def _request(self, method, params):
+        """
+        Send a request and read its answer, skipping any answer to an earlier request
+        :param method: str - service method
+        :param params: dict - method parameters
+        :return: dict - JSON-RPC response
+        """
+        request_id = next(self._ids)
+        request = json.dumps({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+        self._stream.write(request.encode('utf-8') + b'\n')
+        self._stream.flush()
+
+        while True:
+            line = self._stream.readline()
+            if not line:
+                raise ConnectionResetError('Connection closed by the naming service')
+
+            response = json.loads(line.decode('utf-8'))
+            if response.get('id') == request_id:
+                return response
+
+    def ping(self):
+        """
+        :return: dict - service pid and uptime
+        """
+        return self.call('ping')
+
+    def resolve(self, template, task=None, entity_type=None, entity_id=None, engine=None, tokens=None, frame=1):
+        """
+        Resolve a template
+        :param template: str - Toolkit template name ie: shot_maya_work
+        :param task: int or str - Task id, or Task name on the entity ie: anim
+        :param entity_type: str - entity type when task is a name or not given ie: Shot
+        :param entity_id: int - entity id when task is a name or not given
+        :param engine: str - tk-engines key or engine name, used when registering the context
+        :param tokens: dict - values of the keys the context doesn't provide ie: {'name': 'main'}
+        :param frame: int - value used to fill in any frame padding
+        :return: dict - file_name, directory, file_path, is_file, fields
+        """
+        return self.call('resolve', template=template, task=task, entity_type=entity_type, entity_id=entity_id,
+                         engine=engine, tokens=tokens or {}, frame=frame)
+
+    def next_version(self, template, task=None, entity_type=None, entity_id=None, engine=None, tokens=None):
+        """
+        :return: int - next free version of a template, None if it has no version key
+        """
+        return self.call('next_version', template=template, task=task, entity_type=entity_type,
+                         entity_id=entity_id, engine=engine, tokens=tokens or {})
+
+    def templates(self, engine, task=None, entity_type=None, entity_id=None):
+        """
+        :return: list of str - names of the templates of an engine for a task/entity
+        """
+        return self.call('templates', engine=engine, task=task, entity_type=entity_type, entity_id=entity_id)
+
+    def from_path(self, path):
+        """
+        :return: dict - template, fields, context and tokens of a path, None if no template matches
+        """
+        return self.call('from_path', path=path)